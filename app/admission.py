@@ -0,0 +1,141 @@
+"""Admission control for check submissions.
+
+Before a job is created, the API estimates how long it would wait. The
+estimate uses the backlog in the fair scheduler's queues, the number of live
+terminal workers and their measured service time. A submission is refused
+with 429 when the tenant's own backlog is over its limit, and with 503 when
+the whole system is over its depth or wait limit, or when no pinned worker
+is alive to run it. Accepted jobs are told when they should complete.
+"""
+import math
+import time
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+from app.models import CheckPriority
+from app.redis_client import get_async_redis
+from app.scheduler import KEY_PREFIX as SCHED_PREFIX, DEFAULT_TENANT
+from app.terminal_router import KEY_PREFIX as TERMINAL_PREFIX, OWNER_TTL_SECONDS, terminal_router
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_TTL_SECONDS = 1.0
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+@dataclass
+class CapacitySnapshot:
+    queued: int  # Jobs waiting in all tenant queues
+    terminals: int  # Workers that can take jobs
+    service_seconds: float  # Mean time a terminal spends on one check
+
+    @property
+    def throughput_per_second(self) -> float:
+        return self.terminals / self.service_seconds
+
+    def wait_seconds(self, ahead: int) -> float:
+        return ahead / self.throughput_per_second
+
+class AdmissionController:
+    def __init__(self):
+        self._snapshot: Optional[CapacitySnapshot] = None
+        self._snapshot_at = 0.0
+
+    async def snapshot(self) -> CapacitySnapshot:
+        """System-wide backlog and capacity, shared by all requests for SNAPSHOT_TTL_SECONDS"""
+        now = time.monotonic()
+        if self._snapshot and now - self._snapshot_at < SNAPSHOT_TTL_SECONDS:
+            return self._snapshot
+
+        redis_client = get_async_redis()
+        terminal_ids = terminal_router.terminal_ids()
+
+        pipe = redis_client.pipeline(transaction=False)
+        for priority in CheckPriority:
+            pipe.smembers(f"{SCHED_PREFIX}:{priority.value}:members")
+        for terminal_id in terminal_ids:
+            pipe.exists(f"{TERMINAL_PREFIX}:{terminal_id}:owner")
+            pipe.hmget(f"{TERMINAL_PREFIX}:{terminal_id}:stats", "jobs", "busy_seconds")
+        replies = await pipe.execute()
+
+        members = replies[:len(CheckPriority)]
+        pipe = redis_client.pipeline(transaction=False)
+        for priority, tenants in zip(CheckPriority, members):
+            for tenant in tenants:
+                pipe.llen(f"{SCHED_PREFIX}:{priority.value}:q:{tenant.decode()}")
+        queued = sum(await pipe.execute())
+
+        terminal_replies = replies[len(CheckPriority):]
+        live = sum(1 for owned in terminal_replies[0::2] if owned)
+        jobs = sum(int(stats[0] or 0) for stats in terminal_replies[1::2])
+        busy_seconds = sum(float(stats[1] or 0) for stats in terminal_replies[1::2])
+
+        if not settings.admission_require_live_workers:
+            # Unpinned workers don't register as owners; assume every configured terminal serves
+            live = live or len(terminal_ids) or 1
+        self._snapshot = CapacitySnapshot(
+            queued=queued,
+            terminals=live,
+            service_seconds=busy_seconds / jobs if jobs else settings.admission_default_service_seconds
+        )
+        self._snapshot_at = now
+        return self._snapshot
+
+    async def tenant_queued(self, tenant: Optional[str]) -> int:
+        tenant = tenant or DEFAULT_TENANT
+        pipe = get_async_redis().pipeline(transaction=False)
+        for priority in CheckPriority:
+            pipe.llen(f"{SCHED_PREFIX}:{priority.value}:q:{tenant}")
+        return sum(await pipe.execute())
+
+    async def admit(self, tenant: Optional[str]) -> datetime:
+        """Raise AdmissionRejected if the job should not be accepted, else return its estimated completion"""
+        try:
+            capacity = await self.snapshot()
+            tenant_queued = await self.tenant_queued(tenant)
+        except Exception as e:
+            # Without Redis the job couldn't be scheduled anyway; let create_check report that
+            logger.warning(f"Admission check skipped: {e}")
+            return datetime.utcnow() + timedelta(seconds=settings.admission_default_service_seconds)
+
+        if capacity.terminals == 0:
+            # A restarted worker claims its terminal within seconds; a dead one's claim lapses after the TTL
+            raise AdmissionRejected(503, "No terminal workers are running", OWNER_TTL_SECONDS // 2)
+
+        if tenant_queued >= settings.admission_max_tenant_queue_depth:
+            excess = tenant_queued - settings.admission_max_tenant_queue_depth + 1
+            raise AdmissionRejected(
+                429,
+                f"Too many queued checks for this account ({tenant_queued})",
+                max(1, math.ceil(capacity.wait_seconds(excess)))
+            )
+
+        if capacity.queued >= settings.admission_max_queue_depth:
+            excess = capacity.queued - settings.admission_max_queue_depth + 1
+            raise AdmissionRejected(
+                503,
+                f"Check queue is full ({capacity.queued} waiting)",
+                max(1, math.ceil(capacity.wait_seconds(excess)))
+            )
+
+        wait = capacity.wait_seconds(capacity.queued)
+        if wait > settings.admission_max_wait_seconds:
+            raise AdmissionRejected(
+                503,
+                f"Estimated wait of {int(wait)}s exceeds the limit",
+                max(1, math.ceil(wait - settings.admission_max_wait_seconds))
+            )
+
+        # Count this job in the shared snapshot until it is next refreshed
+        capacity.queued += 1
+        return datetime.utcnow() + timedelta(seconds=wait + capacity.service_seconds)
+
+# Global admission controller
+admission_controller = AdmissionController()
@@ -0,0 +1,179 @@
+"""Incremental per-tenant job analytics.
+
+Workers add each finished job to an all-time counter hash and to hourly and
+daily bucket hashes in Redis. Reading a period costs one HGETALL per bucket,
+however many jobs the tenant has.
+
+The first live job recorded also stores when live recording began; jobs
+that finished before then are added by backfill_analytics.py.
+"""
+import bisect
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any, Iterable
+from app.redis_client import get_redis, get_async_redis
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "brymix:analytics"
+LIVE_SINCE_KEY = f"{KEY_PREFIX}:live_since"  # completed_at of the first job recorded live
+BACKFILLED_KEY = f"{KEY_PREFIX}:backfilled_before"  # Jobs finished before this are in the rollups
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BOUNDS = [1, 2, 5, 10, 20, 30, 60, 120, 300, 600, 1200, 1800, 3600]
+
+GRANULARITIES = {
+    "hour": {"format": "%Y%m%d%H", "step": timedelta(hours=1), "ttl": 8 * 24 * 3600},
+    "day": {"format": "%Y%m%d", "step": timedelta(days=1), "ttl": 400 * 24 * 3600},
+}
+
+def _tenant_key(tenant: Optional[str]) -> str:
+    return hashlib.sha256((tenant or "default").encode()).hexdigest()[:16]
+
+def _bucket_key(tenant: Optional[str], granularity: str, when: datetime) -> str:
+    label = when.strftime(GRANULARITIES[granularity]["format"])
+    return f"{KEY_PREFIX}:{_tenant_key(tenant)}:{granularity}:{label}"
+
+def _totals_key(tenant: Optional[str]) -> str:
+    return f"{KEY_PREFIX}:{_tenant_key(tenant)}:total"
+
+class JobAnalytics:
+    @staticmethod
+    def record_job(
+        tenant: Optional[str],
+        status: str,
+        created_at: datetime,
+        completed_at: datetime,
+        challenge_status: Optional[str] = None,
+        violation_types: Iterable[str] = ()
+    ):
+        """Count a finished job; never lets a Redis problem fail the job"""
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            pipe.setnx(LIVE_SINCE_KEY, completed_at.isoformat())
+            JobAnalytics._add(pipe, tenant, status, created_at, completed_at, challenge_status, violation_types)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to record analytics for tenant {tenant}: {e}")
+
+    @staticmethod
+    def record_jobs(jobs: Iterable[Dict[str, Any]]):
+        """Count a batch of historical jobs (record_job keyword arguments) in one round trip; raises on failure"""
+        pipe = get_redis().pipeline(transaction=False)
+        for job in jobs:
+            JobAnalytics._add(pipe, **job)
+        pipe.execute()
+
+    @staticmethod
+    def _add(
+        pipe,
+        tenant: Optional[str],
+        status: str,
+        created_at: datetime,
+        completed_at: datetime,
+        challenge_status: Optional[str] = None,
+        violation_types: Iterable[str] = ()
+    ):
+        latency = max(0.0, (completed_at - created_at).total_seconds())
+        latency_bucket = bisect.bisect_left(LATENCY_BOUNDS, latency)
+
+        increments = {"jobs": 1, f"status:{status}": 1, f"latency:{latency_bucket}": 1}
+        if challenge_status:
+            increments[f"challenge:{challenge_status}"] = 1
+        for violation_type in set(violation_types):
+            increments[f"violation:{violation_type}"] = 1
+
+        keys = [(_totals_key(tenant), None)] + [
+            (_bucket_key(tenant, granularity, completed_at), spec["ttl"])
+            for granularity, spec in GRANULARITIES.items()
+        ]
+        for key, ttl in keys:
+            for field, amount in increments.items():
+                pipe.hincrby(key, field, amount)
+            pipe.hincrbyfloat(key, "latency_sum", latency)
+            if ttl:
+                pipe.expire(key, ttl)
+
+    @staticmethod
+    def summarize(counters: Dict[str, float]) -> Dict[str, Any]:
+        """Turn raw counters into rates and latency percentiles"""
+        jobs = int(counters.get("jobs", 0))
+        passed = int(counters.get("challenge:passed", 0))
+        challenge_failed = int(counters.get("challenge:failed", 0))
+        histogram = [int(counters.get(f"latency:{i}", 0)) for i in range(len(LATENCY_BOUNDS) + 1)]
+
+        def percentile(p: float) -> Optional[float]:
+            if not jobs:
+                return None
+            target = p * jobs
+            cumulative = 0
+            for i, count in enumerate(histogram):
+                cumulative += count
+                if cumulative >= target:
+                    break
+            # Upper bound of the bucket; the open-ended last bucket reports its lower bound
+            return float(LATENCY_BOUNDS[min(i, len(LATENCY_BOUNDS) - 1)])
+
+        return {
+            "jobs": jobs,
+            "status": {
+                field.split(":", 1)[1]: int(value)
+                for field, value in counters.items() if field.startswith("status:")
+            },
+            "challenge": {"passed": passed, "failed": challenge_failed},
+            "pass_rate": round(passed / (passed + challenge_failed) * 100, 2) if passed + challenge_failed else 0.0,
+            "violations": {
+                field.split(":", 1)[1]: int(value)
+                for field, value in counters.items() if field.startswith("violation:")
+            },
+            "latency_seconds": {
+                "avg": round(counters.get("latency_sum", 0.0) / jobs, 3) if jobs else None,
+                "p50": percentile(0.50),
+                "p90": percentile(0.90),
+                "p99": percentile(0.99)
+            }
+        }
+
+    @staticmethod
+    async def query(tenant: Optional[str], granularity: str, start: datetime, end: datetime) -> Dict[str, Any]:
+        """Per-bucket and merged summaries for [start, end], plus all-time totals"""
+        spec = GRANULARITIES[granularity]
+        labels = []
+        when = start
+        while when <= end:
+            labels.append(when)
+            when += spec["step"]
+
+        pipe = get_async_redis().pipeline(transaction=False)
+        for when in labels:
+            pipe.hgetall(_bucket_key(tenant, granularity, when))
+        pipe.hgetall(_totals_key(tenant))
+        raw = await pipe.execute()
+
+        def decode(hash_value: Dict[bytes, bytes]) -> Dict[str, float]:
+            return {field.decode(): float(value) for field, value in hash_value.items()}
+
+        merged: Dict[str, float] = {}
+        buckets: List[Dict[str, Any]] = []
+        for when, counters in zip(labels, raw[:-1]):
+            counters = decode(counters)
+            for field, value in counters.items():
+                merged[field] = merged.get(field, 0.0) + value
+            buckets.append({
+                "start": when.isoformat(),
+                "jobs": int(counters.get("jobs", 0)),
+                "completed": int(counters.get("status:completed", 0)),
+                "failed": int(counters.get("status:failed", 0)),
+                "passed": int(counters.get("challenge:passed", 0))
+            })
+
+        return {
+            "granularity": granularity,
+            "buckets": buckets,
+            "period": JobAnalytics.summarize(merged),
+            "all_time": JobAnalytics.summarize(decode(raw[-1]))
+        }
+
+# Global analytics instance
+job_analytics = JobAnalytics()
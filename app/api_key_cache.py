@@ -0,0 +1,107 @@
+"""In-process cache of verified API keys.
+
+Entries are keyed by the SHA-256 of the key and expire after a TTL, which
+bounds how long a revoked key keeps working even if an invalidation message
+is lost. Revocations are broadcast over Redis pub/sub so every API process
+evicts the key straight away.
+"""
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from typing import Optional
+from app.redis_client import get_redis, get_async_redis
+from app.security import hash_api_key
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "brymix:apikey:invalidate"
+
+@dataclass(frozen=True)
+class CachedApiKey:
+    """Detached snapshot of an active ApiKey row"""
+    id: int
+    name: str
+    owner_email: Optional[str]
+    company: Optional[str]
+    webhook_secret: Optional[str]
+
+    @classmethod
+    def from_model(cls, api_key) -> "CachedApiKey":
+        return cls(
+            id=api_key.id,
+            name=api_key.name,
+            owner_email=api_key.owner_email,
+            company=api_key.company,
+            webhook_secret=api_key.webhook_secret
+        )
+
+class ApiKeyCache:
+    """TTL-bounded LRU of resolved API keys"""
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key_hash: str) -> Optional[CachedApiKey]:
+        with self._lock:
+            entry = self._entries.get(key_hash)
+            if entry is None:
+                return None
+            expires_at, api_key = entry
+            if expires_at < time.monotonic():
+                del self._entries[key_hash]
+                return None
+            self._entries.move_to_end(key_hash)
+            return api_key
+
+    def put(self, key_hash: str, api_key: CachedApiKey):
+        with self._lock:
+            self._entries[key_hash] = (time.monotonic() + self.ttl_seconds, api_key)
+            self._entries.move_to_end(key_hash)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key_hash: str):
+        with self._lock:
+            self._entries.pop(key_hash, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+def publish_invalidation(api_key: str):
+    """Tell every API process to drop a revoked key"""
+    key_hash = hash_api_key(api_key)
+    api_key_cache.invalidate(key_hash)
+    try:
+        get_redis().publish(INVALIDATION_CHANNEL, key_hash)
+    except Exception as e:
+        # Other processes still drop it when the TTL runs out
+        logger.warning(f"Failed to publish API key invalidation: {e}")
+
+async def listen_for_invalidations():
+    """Background task for API processes: evict keys revoked anywhere"""
+    while True:
+        pubsub = get_async_redis().pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Anything revoked while we weren't subscribed is unknown, so start clean
+            api_key_cache.clear()
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    api_key_cache.invalidate(message["data"].decode())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"API key invalidation listener error: {e} - reconnecting")
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.aclose()
+
+# Global cache instance
+api_key_cache = ApiKeyCache(settings.api_key_cache_size, settings.api_key_cache_ttl_seconds)
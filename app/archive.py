@@ -0,0 +1,152 @@
+"""Cold storage for old job results.
+
+Results of completed jobs past the retention age are moved out of the jobs
+table into date-partitioned files of zstd-compressed NDJSON
+(archive/YYYY/MM/DD/jobs-<run>.ndjson.zst). Each file is a run of independent
+zstd frames of up to archive_frame_size results, one result JSON per line.
+The job_archive row records the frame's offset and length and the result's
+line, so reading one result back decompresses a single small frame.
+Jobs without a job_metrics row get one before their result leaves the
+table, since the metrics backfill can only read results still in it.
+"""
+import os
+import uuid
+import logging
+import orjson
+import zstandard
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from app.database import Job, JobArchive, JobMetrics
+from app.job_cache import job_key
+from app.redis_client import get_redis
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+Location = Tuple[str, int, int, int]  # path, frame_offset, frame_length, line
+
+class JobArchiver:
+    def __init__(self, archive_dir: str, frame_size: int):
+        self.root = Path(archive_dir)
+        self.frame_size = frame_size
+
+    def _write_file(self, day: datetime, jobs: List[Job]) -> List[JobArchive]:
+        """Write one partition file and return index rows for its jobs"""
+        relative = Path(f"{day:%Y/%m/%d}") / f"jobs-{datetime.utcnow():%H%M%S}-{uuid.uuid4().hex[:8]}.ndjson.zst"
+        path = self.root / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        compressor = zstandard.ZstdCompressor(level=10)
+        entries = []
+        offset = 0
+        with open(path, "wb") as f:
+            for start in range(0, len(jobs), self.frame_size):
+                frame_jobs = jobs[start:start + self.frame_size]
+                frame = compressor.compress(b"\n".join(job.result.encode() for job in frame_jobs))
+                f.write(frame)
+                for line, job in enumerate(frame_jobs):
+                    entries.append(JobArchive(
+                        job_id=job.id,
+                        path=relative.as_posix(),
+                        frame_offset=offset,
+                        frame_length=len(frame),
+                        line=line
+                    ))
+                offset += len(frame)
+            f.flush()
+            # The database will stop holding these results once we commit; make sure the file is real first
+            os.fsync(f.fileno())
+        return entries
+
+    def archive_batch(self, db, cutoff: datetime, batch_size: int) -> int:
+        """Archive up to batch_size completed jobs finished before cutoff; returns how many"""
+        jobs = (
+            db.query(Job)
+            .filter(Job.status == "completed", Job.completed_at < cutoff, Job.result.isnot(None))
+            .order_by(Job.completed_at, Job.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not jobs:
+            return 0
+
+        by_day: Dict[datetime, List[Job]] = {}
+        for job in jobs:
+            by_day.setdefault(datetime(job.completed_at.year, job.completed_at.month, job.completed_at.day), []).append(job)
+
+        for day, day_jobs in by_day.items():
+            db.add_all(self._write_file(day, day_jobs))
+        metrics = self._missing_metrics(db, jobs)
+        db.add_all(metrics)
+        for job in jobs:
+            job.result = None
+        db.commit()
+        if metrics:
+            # Their cached state carries the old result_version
+            try:
+                get_redis().delete(*[job_key(row.job_id) for row in metrics])
+            except Exception as e:
+                logger.warning(f"Failed to evict archived jobs from the job cache: {e}")
+        return len(jobs)
+
+    @staticmethod
+    def _missing_metrics(db, jobs: List[Job]) -> List[JobMetrics]:
+        """job_metrics rows for jobs finished before the table existed"""
+        have = {
+            job_id for (job_id,) in
+            db.query(JobMetrics.job_id).filter(JobMetrics.job_id.in_([job.id for job in jobs]))
+        }
+        rows = []
+        for job in jobs:
+            if job.id in have:
+                continue
+            result = orjson.loads(job.result)
+            if "status" in result:
+                rows.append(JobMetrics.from_result(job, result))
+                # Job listings show the new metrics
+                job.result_version = (job.result_version or 0) + 1
+        return rows
+
+    def archive(self, db, older_than_days: int, batch_size: int = 1000) -> int:
+        """Archive everything past the retention age, one committed batch at a time"""
+        cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+        total = 0
+        while True:
+            archived = self.archive_batch(db, cutoff, batch_size)
+            if not archived:
+                return total
+            total += archived
+            logger.info(f"Archived {total} job results so far")
+
+    def _read_frame(self, path: str, offset: int, length: int) -> List[bytes]:
+        with open(self.root / path, "rb") as f:
+            f.seek(offset)
+            frame = f.read(length)
+        return zstandard.ZstdDecompressor().decompress(frame).split(b"\n")
+
+    def read_result(self, location: Location) -> Optional[bytes]:
+        """Result JSON of one archived job (blocking file read)"""
+        path, offset, length, line = location
+        try:
+            return self._read_frame(path, offset, length)[line]
+        except (OSError, zstandard.ZstdError, IndexError) as e:
+            logger.error(f"Failed to read archived result from {path}@{offset}: {e}")
+            return None
+
+    def read_results(self, locations: Iterable[Location]) -> List[Optional[bytes]]:
+        """read_result for many jobs, decompressing each frame only once"""
+        frames = {}
+        results = []
+        for path, offset, length, line in locations:
+            try:
+                if (path, offset) not in frames:
+                    frames[(path, offset)] = self._read_frame(path, offset, length)
+                results.append(frames[(path, offset)][line])
+            except (OSError, zstandard.ZstdError, IndexError) as e:
+                logger.error(f"Failed to read archived result from {path}@{offset}: {e}")
+                results.append(None)
+        return results
+
+# Global archiver instance
+job_archiver = JobArchiver(settings.archive_dir, settings.archive_frame_size)
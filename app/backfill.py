@@ -0,0 +1,215 @@
+"""Chunked, resumable backfills over stored job results.
+
+A backfill subclasses ResultBackfill and says which jobs it touches (where)
+and what to do with each parsed result (transform). BackfillRunner splits
+the matching jobs into primary-key ranges and runs them on parallel
+threads. Each range is read through a server-side cursor (yield_per) and its
+changes are committed batch by batch. After every commit the last id done
+is saved to a checkpoint file, so an interrupted run resumes where it
+stopped. With dry_run nothing is written.
+"""
+import json
+import time
+import logging
+import threading
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+from sqlalchemy import select, update, bindparam, func
+from app.database import SessionLocal, engine, Job
+from app.job_cache import job_key
+from app.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_DIR = Path(".backfill")
+
+class ResultBackfill:
+    """Base class: rewrites Job.result for every job transform() returns a new result for"""
+    name = "result-backfill"
+    # False: also visit jobs without a stored result, and pass transform() None instead of reading it
+    reads_result = True
+
+    def where(self) -> list:
+        """Extra criteria on Job; jobs without a stored result are always skipped"""
+        return []
+
+    def transform(self, row, result: dict) -> Optional[dict]:
+        """Return the new result, or None to leave this job alone"""
+        raise NotImplementedError
+
+    def write(self, db, changes: List[Tuple[object, dict]]):
+        """Persist one batch of changes (called inside the batch's transaction)"""
+        # The new version changes the job's ETag, so pollers holding the old one get the new result
+        db.execute(
+            update(Job).where(Job.id == bindparam("b_id")).values(
+                result=bindparam("b_result"), result_version=Job.result_version + 1
+            ),
+            [{"b_id": row.id, "b_result": orjson.dumps(result).decode()} for row, result in changes]
+        )
+
+    @staticmethod
+    def bump_versions(db, changes: List[Tuple[object, dict]]):
+        """For write() overrides that change what a job's responses show without rewriting Job.result"""
+        db.execute(
+            update(Job).where(Job.id.in_([row.id for row, _ in changes])).values(result_version=Job.result_version + 1)
+        )
+
+    def finished(self):
+        """Called once after a complete run that wrote its changes"""
+
+class BackfillRunner:
+    def __init__(self, backfill: ResultBackfill, batch_size: int = 500, workers: int = 1, dry_run: bool = False):
+        self.backfill = backfill
+        self.batch_size = batch_size
+        self.workers = workers
+        self.dry_run = dry_run
+        self.checkpoint_path = CHECKPOINT_DIR / f"{backfill.name}.json"
+        self._lock = threading.Lock()
+        self._state = None
+        self._started = 0.0
+
+    def _criteria(self) -> list:
+        return ([Job.result.isnot(None)] if self.backfill.reads_result else []) + self.backfill.where()
+
+    def _partition(self) -> dict:
+        """Split matching ids into up to `workers` contiguous ranges of similar size"""
+        db = SessionLocal()
+        try:
+            total = db.execute(select(func.count()).select_from(Job).where(*self._criteria())).scalar()
+            bounds = []
+            step = total // self.workers if self.workers > 1 else 0
+            for i in range(1, self.workers if step else 1):
+                bound = db.execute(
+                    select(Job.id).where(*self._criteria()).order_by(Job.id).offset(i * step).limit(1)
+                ).scalar()
+                bounds.append(bound)
+        finally:
+            db.close()
+
+        edges = [None] + bounds + [None]
+        return {
+            "total": total,
+            "processed": 0,
+            "changed": 0,
+            "partitions": [
+                {"low": edges[i], "high": edges[i + 1], "last_id": None, "done": False}
+                for i in range(len(edges) - 1)
+            ]
+        }
+
+    def _load_checkpoint(self, restart: bool):
+        if not restart and not self.dry_run and self.checkpoint_path.exists():
+            self._state = json.loads(self.checkpoint_path.read_text())
+            logger.info(f"Resuming {self.backfill.name} from {self.checkpoint_path}")
+        else:
+            self._state = self._partition()
+
+    def _save_checkpoint(self):
+        if self.dry_run:
+            return
+        CHECKPOINT_DIR.mkdir(exist_ok=True)
+        tmp = self.checkpoint_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self._state))
+        tmp.replace(self.checkpoint_path)
+
+    def _report(self):
+        state = self._state
+        elapsed = max(time.monotonic() - self._started, 0.001)
+        rate = state["processed"] / elapsed
+        logger.info(
+            f"{self.backfill.name}: {state['processed']}/{state['total']} jobs, "
+            f"{state['changed']} changed, {rate:.0f} jobs/s{' (dry run)' if self.dry_run else ''}"
+        )
+
+    def _run_partition(self, partition: dict):
+        if partition["done"]:
+            return
+        columns = [Job.id, Job.api_key_owner, Job.status, Job.created_at, Job.completed_at]
+        if self.backfill.reads_result:
+            columns.append(Job.result)
+        query = select(*columns).where(*self._criteria())
+        if partition["last_id"]:
+            query = query.where(Job.id > partition["last_id"])
+        elif partition["low"]:
+            query = query.where(Job.id >= partition["low"])
+        if partition["high"]:
+            query = query.where(Job.id < partition["high"])
+
+        # One connection streams the range, another commits each batch
+        with engine.connect() as reader:
+            rows = reader.execute(query.order_by(Job.id).execution_options(stream_results=True, yield_per=self.batch_size))
+            for batch in rows.partitions(self.batch_size):
+                changes = []
+                for row in batch:
+                    result = None
+                    if self.backfill.reads_result:
+                        try:
+                            result = json.loads(row.result)
+                        except json.JSONDecodeError:
+                            logger.warning(f"Skipping job {row.id}: stored result is not valid JSON")
+                            continue
+                    new_result = self.backfill.transform(row, result)
+                    if new_result is not None:
+                        changes.append((row, new_result))
+
+                if changes and not self.dry_run:
+                    db = SessionLocal()
+                    try:
+                        self.backfill.write(db, changes)
+                        db.commit()
+                    finally:
+                        db.close()
+                    _evict_cached(row.id for row, _ in changes)
+
+                with self._lock:
+                    partition["last_id"] = batch[-1].id
+                    self._state["processed"] += len(batch)
+                    self._state["changed"] += len(changes)
+                    self._save_checkpoint()
+                    self._report()
+
+        with self._lock:
+            partition["done"] = True
+            self._save_checkpoint()
+
+    def run(self, restart: bool = False) -> dict:
+        """Run (or resume) the backfill; returns the final counters"""
+        self._load_checkpoint(restart)
+        self._started = time.monotonic()
+        partitions = self._state["partitions"]
+        with ThreadPoolExecutor(max_workers=len(partitions), thread_name_prefix=self.backfill.name) as pool:
+            for future in [pool.submit(self._run_partition, partition) for partition in partitions]:
+                future.result()
+        self._report()
+        if not self.dry_run:
+            self.backfill.finished()
+            # Finished: the next run of this backfill starts from scratch
+            self.checkpoint_path.unlink(missing_ok=True)
+        return {key: self._state[key] for key in ("total", "processed", "changed")}
+
+def _evict_cached(job_ids):
+    """Drop rewritten jobs from the Redis hot cache so nobody reads the old result"""
+    try:
+        keys = [job_key(job_id) for job_id in job_ids]
+        if keys:
+            get_redis().delete(*keys)
+    except Exception as e:
+        logger.warning(f"Failed to evict backfilled jobs from the job cache: {e}")
+
+def run_cli(backfill: ResultBackfill):
+    """Command-line entry point shared by the backfill scripts"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description=f"Run the {backfill.name} backfill")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=1, help="Primary-key ranges processed in parallel")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing")
+    parser.add_argument("--restart", action="store_true", help="Ignore a saved checkpoint and start over")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+    runner = BackfillRunner(backfill, batch_size=args.batch_size, workers=args.workers, dry_run=args.dry_run)
+    counters = runner.run(restart=args.restart)
+    print(f"\n✅ {counters['changed']} of {counters['processed']} jobs {'would change' if args.dry_run else 'updated'}")
@@ -0,0 +1,33 @@
+"""Celery application shared by the API and the workers.
+
+The API only sends tasks, by name, so it never imports the task code in
+app.celery_worker (and with it the MT5 terminal pool and MetaTrader5).
+Workers are started with `celery -A app.celery_worker.celery_app`, which
+registers the tasks on this same app.
+"""
+from celery import Celery
+from config import settings
+
+# Task names are the historical module paths, so messages already queued keep working
+DISPATCH_TASK = "app.celery_worker.dispatch_next_check"
+
+celery_app = Celery(
+    "brymix",
+    broker=settings.celery_broker_url,
+    backend=settings.celery_result_backend
+)
+
+celery_app.conf.update(
+    task_serializer="msgpack",
+    result_serializer="msgpack",
+    accept_content=["msgpack", "json"],  # json for messages queued by older API processes
+    task_compression=settings.celery_compression,
+    # The jobs table is the source of truth for results; don't copy them into Redis
+    task_ignore_result=True,
+    # Tokens must not pile up in one worker's prefetch buffer while other terminals idle
+    worker_prefetch_multiplier=1
+)
+
+def send_dispatch_token(queue: str):
+    """Ask a worker on `queue` to run whichever check the fair scheduler picks next"""
+    celery_app.send_task(DISPATCH_TASK, queue=queue)
@@ -1,9 +1,24 @@
-from celery import Celery
+from celery.signals import worker_init, worker_shutdown
 from config import settings
-import json
+import orjson
+import asyncio
+import os
+import socket
+import threading
+import time
 from datetime import datetime
-from app.database import SessionLocal, Job, ApiKey, ApiKey
-from app.mt5_pool import mt5_pool
+from typing import List
+from app.database import SessionLocal, Job, JobMetrics, ApiKey
+from app.celery_app import celery_app, DISPATCH_TASK, send_dispatch_token
+from app.mt5_pool import get_mt5_pool
+from app.scheduler import fair_scheduler
+from app.coalescer import check_coalescer
+from app.terminal_router import terminal_router, terminal_queue
+from app.progress import progress_publisher
+from app.analytics import job_analytics
+from app.status_writer import status_writer
+from app.job_cache import job_cache
+from app.redis_client import get_redis
 from app.rule_checker import RuleChecker
 from app.webhook_client import WebhookClient
 import logging
@@ -12,15 +27,83 @@ import ipaddress
 
 logger = logging.getLogger(__name__)
 
-celery_app = Celery(
-    "brymix",
-    broker=settings.celery_broker_url,
-    backend=settings.celery_result_backend
-)
+@worker_init.connect
+def _pin_worker_to_terminal(**kwargs):
+    """Claim this worker's terminal queue so no second process can use the terminal"""
+    terminal_id = settings.mt5_terminal_id
+    if terminal_id is None:
+        logger.warning("MT5_TERMINAL_ID not set - worker is not pinned to a terminal queue")
+        return
+    
+    owner = _terminal_owner()
+    try:
+        claimed = terminal_router.claim(terminal_id, owner)
+    except Exception as e:
+        logger.critical(f"Could not claim terminal {terminal_id}: {e}")
+        claimed = False
+    if not claimed:
+        # Celery only logs exceptions raised by worker_init receivers, so stop the process outright
+        logger.critical(f"Terminal {terminal_id} is already owned by another worker - exiting")
+        logging.shutdown()
+        os._exit(1)
+    
+    def heartbeat():
+        while True:
+            time.sleep(20)
+            try:
+                terminal_router.heartbeat(terminal_id, owner)
+            except Exception as e:
+                logger.error(f"Terminal {terminal_id} heartbeat failed: {e}")
+            _sweep_lost_leaders()
+            _resend_lost_tokens()
+    
+    threading.Thread(target=heartbeat, daemon=True).start()
+    logger.info(f"Worker {owner} pinned to queue {terminal_queue(terminal_id)}")
+
+@worker_shutdown.connect
+def _release_terminal(**kwargs):
+    """Free the terminal at once instead of after the owner key's TTL"""
+    if settings.mt5_terminal_id is None:
+        return
+    try:
+        terminal_router.release(settings.mt5_terminal_id, _terminal_owner())
+    except Exception as e:
+        logger.warning(f"Failed to release terminal {settings.mt5_terminal_id}: {e}")
+
+def _terminal_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
 
-@celery_app.task(bind=True)
+@worker_init.connect
+def _build_mt5_pool(**kwargs):
+    """Set up the terminal pool when the worker starts rather than on first job"""
+    get_mt5_pool()
+
+@celery_app.task(bind=True, ignore_result=True)
 def process_challenge_check(self, job_id: str, job_data: dict):
+    """Run a specific check (kept for messages queued before fair scheduling)"""
+    run_challenge_check(job_id, job_data)
+
+@celery_app.task(name=DISPATCH_TASK, ignore_result=True)
+def dispatch_next_check():
+    """Dispatch token: run whichever check the fair scheduler picks next"""
+    if settings.mt5_terminal_id is not None:
+        terminal_router.token_received(settings.mt5_terminal_id)
+    
+    _sweep_lost_leaders()
+    
+    scheduled = fair_scheduler.pop()
+    if not scheduled:
+        logger.info("Dispatch token found no scheduled checks")
+        return
+    
+    logger.info(f"Dispatching job {scheduled.job_id} for tenant {scheduled.tenant} ({scheduled.priority.value})")
+    run_challenge_check(scheduled.job_id, scheduled.job_data, scheduled.tenant)
+
+def run_challenge_check(job_id: str, job_data: dict, tenant: str = None):
     db = SessionLocal()
+    job = None
+    fanned_out = False
+    fingerprint = check_coalescer.fingerprint(tenant, job_data)
     
     try:
         # Update job status
@@ -29,14 +112,24 @@ def process_challenge_check(self, job_id: str, job_data: dict):
             logger.error(f"Job {job_id} not found in database")
             return
         
-        job.status = "processing"
-        db.commit()
+        # The rollback below expires `job`; touching it during the check would reopen a transaction
+        owner, created_at = job.api_key_owner, job.created_at
+        
+        # Followers are keyed by the owner the API saw; keep them while this runs
+        fingerprint = check_coalescer.fingerprint(owner, job_data)
+        check_coalescer.refresh(fingerprint, job_id)
+        
+        # Intermediate state goes through the batching writer; only the final state is committed here
+        status_writer.submit(job_id, "processing")
+        job_cache.store(job_id, owner, "processing", created_at)
+        db.rollback()  # End the read transaction instead of holding it for the whole check
+        progress_publisher.publish(job_id, owner, "processing")
         
         # Get MT5 terminal from pool
         terminal = None
         loop = None
+        mt5_pool = get_mt5_pool()
         try:
-            import asyncio
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
             
@@ -47,6 +140,8 @@ def process_challenge_check(self, job_id: str, job_data: dict):
                 raise Exception("No available MT5 terminals in pool")
             
             logger.info(f"Using terminal {terminal.id} for job {job_id}")
+            busy_since = time.time()
+            terminal_router.mark_busy(terminal.id)
             
             # Connect terminal to MT5 account
             connected = loop.run_until_complete(
@@ -66,10 +161,10 @@ def process_challenge_check(self, job_id: str, job_data: dict):
             from app.models import CheckRequest
             
             # Create MT5Client without re-initializing (already done by pool)
-            mt5_client = MT5Client(terminal.path, settings.mt5_timeout)
+            mt5_client = MT5Client(terminal.path, settings.mt5_timeout, backend=mt5_pool.mt5)
             mt5_client.connected = True  # Mark as already connected
             
-            checker = RuleChecker(mt5_client)
+            checker = RuleChecker(mt5_client, _leader_reporter(job_id, owner, fingerprint))
             request = CheckRequest(**job_data)
             result = checker.check_challenge(request, job_id)
             
@@ -79,34 +174,21 @@ def process_challenge_check(self, job_id: str, job_data: dict):
             # Update job with result
             job.status = "completed"
             job.completed_at = datetime.utcnow()
-            job.result = json.dumps(result_dict)
+            # Serialized once: stored, cached and sent to the webhook as these exact bytes
+            result_json = orjson.dumps(result_dict)
+            job.result = result_json.decode()
+            db.add(JobMetrics.from_result(job, result_dict))
             db.commit()
+            job_cache.store_job(job, result=result_json)
+            progress_publisher.publish(job_id, owner, "completed", challenge_status=result_dict["status"])
+            _record_analytics(job, result_dict)
             
             # Send webhook if callback_url provided
-            if job_data.get("callback_url"):
-                if _is_safe_url(job_data["callback_url"]):
-                    # Get webhook secret for this job's API key
-                    api_key_obj = db.query(ApiKey).filter(
-                        ApiKey.owner_email == job.api_key_owner,
-                        ApiKey.active == True
-                    ).first()
-                    
-                    if api_key_obj and api_key_obj.webhook_secret:
-                        import asyncio
-                        webhook_client = WebhookClient()
-                        loop = asyncio.new_event_loop()
-                        asyncio.set_event_loop(loop)
-                        loop.run_until_complete(
-                            webhook_client.send_result(
-                                job_data["callback_url"], 
-                                result_dict, 
-                                api_key_obj.webhook_secret
-                            )
-                        )
-                    else:
-                        logger.warning(f"No webhook secret found for job {job_id}")
-                else:
-                    logger.warning(f"Blocked unsafe callback URL: {job_data['callback_url']}")
+            _send_webhook(db, job, job_data.get("callback_url"), result_json)
+            
+            # Identical submissions that arrived while this ran get the same result
+            _fan_out_result(db, job, fingerprint, result_dict)
+            fanned_out = True
             
             return result_dict
             
@@ -114,18 +196,196 @@ def process_challenge_check(self, job_id: str, job_data: dict):
             if terminal and loop:
                 loop.run_until_complete(mt5_pool.release_terminal(terminal))
                 loop.close()
+                terminal_router.mark_idle(terminal.id, time.time() - busy_since)
     
     except Exception as e:
         logger.error(f"Job {job_id} failed: {e}")
-        job.status = "failed"
-        job.error_message = str(e)
-        job.completed_at = datetime.utcnow()
-        db.commit()
+        if job:
+            job.status = "failed"
+            job.error_message = str(e)
+            job.completed_at = datetime.utcnow()
+            db.commit()
+            job_cache.store_job(job)
+            progress_publisher.publish(job_id, owner, "failed", error=str(e))
+            _record_analytics(job)
+            _fan_out_failure(db, fingerprint, job_id, str(e), job.completed_at)
+            fanned_out = True
         raise
     
+    finally:
+        # Any exit that didn't fan out (missing row, failure before the job loaded) must not strand followers
+        if not fanned_out:
+            _fan_out_failure(db, fingerprint, job_id, "Coalesced check did not complete - resubmit")
+        db.close()
+
+def _leader_reporter(job_id: str, tenant: str, fingerprint: str):
+    """Progress callback that also keeps the coalescing leader alive; a hung MT5 call stops both"""
+    report = progress_publisher.reporter(job_id, tenant)
+    def report_and_refresh(stage: str, **data):
+        report(stage, **data)
+        try:
+            check_coalescer.refresh(fingerprint, job_id)
+        except Exception as e:
+            logger.warning(f"Failed to refresh coalescing leader {job_id}: {e}")
+    return report_and_refresh
+
+def _sweep_lost_leaders():
+    """Fail the followers of leaders that stopped refreshing (worker killed, MT5 call hung, never queued)"""
+    try:
+        expired = check_coalescer.expired_leaders()
+    except Exception as e:
+        logger.error(f"Failed to sweep lost coalescing leaders: {e}")
+        return
+    if not expired:
+        return
+    
+    db = SessionLocal()
+    try:
+        for fingerprint, leader_id in expired:
+            status = db.query(Job.status).filter(Job.id == leader_id).scalar()
+            if status == "pending":
+                # Still waiting in the fair-share queue
+                check_coalescer.refresh(fingerprint, leader_id)
+                continue
+            logger.warning(f"Coalescing leader {leader_id} was lost ({status or 'missing'})")
+            _fan_out_failure(db, fingerprint, leader_id, "Coalesced check was lost - resubmit")
+    except Exception as e:
+        logger.error(f"Failed to sweep lost coalescing leaders: {e}")
     finally:
         db.close()
 
+def _resend_lost_tokens():
+    """Send a token for each scheduled job that has none (send failed, or routed to a dead worker)"""
+    try:
+        # One worker per heartbeat interval, or each would top up the same shortfall
+        if not get_redis().set("brymix:sched:token_check", _terminal_owner(), nx=True, ex=15):
+            return
+        missing = fair_scheduler.depth() - terminal_router.live_tokens()
+        if missing > 0:
+            logger.warning(f"{missing} scheduled check(s) have no dispatch token - re-sending")
+            for _ in range(missing):
+                queue = terminal_router.route()
+                try:
+                    send_dispatch_token(queue)
+                except Exception:
+                    terminal_router.token_unsent(queue)
+                    raise
+    except Exception as e:
+        logger.error(f"Failed to re-send lost dispatch tokens: {e}")
+
+def _record_analytics(job: Job, result_dict: dict = None):
+    """Add a finished job to its tenant's analytics rollups"""
+    job_analytics.record_job(
+        job.api_key_owner,
+        job.status,
+        job.created_at,
+        job.completed_at,
+        challenge_status=result_dict["status"] if result_dict else None,
+        violation_types=[v["rule"] for v in result_dict["violations"]] if result_dict else ()
+    )
+
+def _send_webhook(db, job: Job, callback_url: str, payload: bytes):
+    """Send a job's serialized result to its callback URL, signed with its API key's webhook secret"""
+    if not callback_url:
+        return
+    
+    if not _is_safe_url(callback_url):
+        logger.warning(f"Blocked unsafe callback URL: {callback_url}")
+        return
+    
+    # Get webhook secret for this job's API key
+    api_key_obj = db.query(ApiKey).filter(
+        ApiKey.owner_email == job.api_key_owner,
+        ApiKey.active == True
+    ).first()
+    
+    if not api_key_obj or not api_key_obj.webhook_secret:
+        logger.warning(f"No webhook secret found for job {job.id}")
+        return
+    
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(
+            WebhookClient.send_result(callback_url, payload, api_key_obj.webhook_secret)
+        )
+    finally:
+        loop.close()
+
+def _fan_out_result(db, job: Job, fingerprint: str, result_dict: dict):
+    """Complete every follower job attached to this one with its result"""
+    followers = []
+    try:
+        followers = check_coalescer.release(fingerprint, job.id)
+        if not followers:
+            return
+        
+        follower_jobs = db.query(Job).filter(Job.id.in_([f["job_id"] for f in followers])).all()
+        callbacks = {f["job_id"]: f.get("callback_url") for f in followers}
+        
+        deliveries = []
+        for follower_job in follower_jobs:
+            # Same check, but the payload must carry the follower's own identifiers
+            follower_result = dict(
+                result_dict,
+                job_id=follower_job.id,
+                user_id=follower_job.user_id,
+                challenge_id=follower_job.challenge_id
+            )
+            follower_job.status = "completed"
+            follower_job.completed_at = job.completed_at
+            follower_json = orjson.dumps(follower_result)
+            follower_job.result = follower_json.decode()
+            db.add(JobMetrics.from_result(follower_job, follower_result))
+            deliveries.append((follower_job, callbacks[follower_job.id], follower_result, follower_json))
+        db.commit()
+        
+        for follower_job, callback_url, follower_result, follower_json in deliveries:
+            job_cache.store_job(follower_job, result=follower_json)
+            progress_publisher.publish(
+                follower_job.id, follower_job.api_key_owner, "completed",
+                challenge_status=follower_result["status"], coalesced_with=job.id
+            )
+            _record_analytics(follower_job, follower_result)
+            _send_webhook(db, follower_job, callback_url, follower_json)
+        
+        logger.info(f"Job {job.id} result fanned out to {len(deliveries)} follower(s)")
+    except Exception as e:
+        logger.error(f"Failed to fan out result of job {job.id}: {e}")
+        # Released from Redis already, so nothing else would ever finish them
+        _fail_followers(db, job.id, [f["job_id"] for f in followers], "Coalesced check result could not be saved - resubmit")
+
+def _fan_out_failure(db, fingerprint: str, leader_id: str, error_message: str, completed_at: datetime = None):
+    """Fail every follower job attached to a leader; a no-op once its followers were released"""
+    try:
+        followers = check_coalescer.release(fingerprint, leader_id)
+    except Exception as e:
+        logger.error(f"Failed to fan out failure of job {leader_id}: {e}")
+        return
+    if followers:
+        _fail_followers(db, leader_id, [f["job_id"] for f in followers], error_message, completed_at)
+
+def _fail_followers(db, leader_id: str, follower_ids: List[str], error_message: str, completed_at: datetime = None):
+    """Mark released follower jobs failed; they are no longer in Redis, so this is their last chance"""
+    if not follower_ids:
+        return
+    try:
+        db.rollback()
+        # Only followers still waiting; any already written keep their result
+        follower_jobs = db.query(Job).filter(Job.id.in_(follower_ids), Job.status == "pending").all()
+        for follower_job in follower_jobs:
+            follower_job.status = "failed"
+            follower_job.error_message = error_message
+            follower_job.completed_at = completed_at or datetime.utcnow()
+        db.commit()
+        for follower_job in follower_jobs:
+            job_cache.store_job(follower_job)
+            progress_publisher.publish(follower_job.id, follower_job.api_key_owner, "failed", error=error_message, coalesced_with=leader_id)
+            _record_analytics(follower_job)
+        logger.info(f"Job {leader_id} failure fanned out to {len(follower_jobs)} follower(s)")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Failed to fail followers {follower_ids} of job {leader_id}: {e}")
+
 def _is_safe_url(url: str) -> bool:
     """Validate URL to prevent SSRF attacks"""
     try:
@@ -136,7 +396,7 @@ def _is_safe_url(url: str) -> bool:
             return False
         
         # Block localhost and private IPs
-        if parsed.hostname:
+        if parsed.hostname and not settings.webhook_allow_private_urls:
             try:
                 ip = ipaddress.ip_address(parsed.hostname)
                 if ip.is_private or ip.is_loopback:
@@ -0,0 +1,155 @@
+"""Coalescing of identical in-flight checks.
+
+The first submission for an account becomes the leader and is scheduled as
+usual. Identical submissions from the same tenant while it is in flight are
+attached as followers and receive the leader's result instead of running.
+
+Every leader is also listed with a deadline, pushed back whenever the leader
+starts or reports progress. A leader past its deadline was lost (its worker
+died or an MT5 call hung), and workers sweep its followers. The followers
+list outlives the deadline so a sweep still finds it.
+"""
+import json
+import time
+import hashlib
+import logging
+from typing import Optional, List, Dict, Any, Tuple
+from app.redis_client import get_redis
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "brymix:coalesce"
+
+LEADERS_KEY = f"{KEY_PREFIX}:leaders"
+
+# Attach to the current leader if there is one, otherwise become the leader.
+# The clock comes in as ARGV[6]: scripts that read TIME can't write before Redis 5.
+_ATTACH_OR_CLAIM_SCRIPT = """
+local leader = redis.call('GET', KEYS[1])
+if leader then
+    local followers = ARGV[3] .. leader
+    redis.call('RPUSH', followers, ARGV[2])
+    redis.call('EXPIRE', followers, 2 * tonumber(ARGV[4]))
+    return leader
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[4])
+redis.call('ZADD', KEYS[2], tonumber(ARGV[6]) + tonumber(ARGV[4]), ARGV[5])
+return false
+"""
+
+# Push back a leader's deadline and keep its keys alive
+_REFRESH_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+end
+if redis.call('ZSCORE', KEYS[3], ARGV[2]) then
+    redis.call('ZADD', KEYS[3], tonumber(ARGV[4]) + tonumber(ARGV[3]), ARGV[2])
+    redis.call('EXPIRE', KEYS[2], 2 * tonumber(ARGV[3]))
+end
+"""
+
+# Stop accepting followers for a leader and hand back the ones attached so far
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+end
+redis.call('ZREM', KEYS[3], ARGV[2])
+local followers = redis.call('LRANGE', KEYS[2], 0, -1)
+redis.call('DEL', KEYS[2])
+return followers
+"""
+
+# Close a leader that will never run and leave its followers for the next sweep
+_ABANDON_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+end
+if redis.call('ZSCORE', KEYS[2], ARGV[2]) then
+    redis.call('ZADD', KEYS[2], 0, ARGV[2])
+end
+"""
+
+class CheckCoalescer:
+    def __init__(self):
+        self._attach_or_claim = None
+        self._refresh = None
+        self._release = None
+        self._abandon = None
+
+    def _scripts(self):
+        if self._attach_or_claim is None:
+            redis_client = get_redis()
+            self._attach_or_claim = redis_client.register_script(_ATTACH_OR_CLAIM_SCRIPT)
+            self._refresh = redis_client.register_script(_REFRESH_SCRIPT)
+            self._release = redis_client.register_script(_RELEASE_SCRIPT)
+            self._abandon = redis_client.register_script(_ABANDON_SCRIPT)
+        return self._attach_or_claim, self._refresh, self._release, self._abandon
+
+    @staticmethod
+    def _member(fingerprint: str, job_id: str) -> str:
+        """Entry in the leaders set; job ids never contain ':'"""
+        return f"{fingerprint}:{job_id}"
+
+    @staticmethod
+    def fingerprint(tenant: Optional[str], job_data: Dict[str, Any]) -> str:
+        """Identity of a check: same tenant, account, credentials, rules and initial balance"""
+        identity = {
+            "tenant": tenant,
+            "mt5_login": str(job_data["mt5_login"]),
+            "mt5_server": job_data["mt5_server"],
+            "mt5_password": job_data["mt5_password"],
+            "initial_balance": float(job_data["initial_balance"]),
+            "rules": job_data["rules"],
+        }
+        return hashlib.sha256(json.dumps(identity, sort_keys=True).encode()).hexdigest()
+
+    def attach_or_claim(self, fingerprint: str, job_id: str, callback_url: Optional[str]) -> Optional[str]:
+        """Returns the leader job_id if this job was attached as a follower, None if it is the leader"""
+        if not settings.coalesce_checks:
+            return None
+
+        attach_or_claim, _, _, _ = self._scripts()
+        follower = json.dumps({"job_id": job_id, "callback_url": callback_url})
+        leader = attach_or_claim(
+            keys=[f"{KEY_PREFIX}:inflight:{fingerprint}", LEADERS_KEY],
+            args=[
+                job_id, follower, f"{KEY_PREFIX}:followers:", settings.coalesce_ttl_seconds,
+                self._member(fingerprint, job_id), time.time()
+            ]
+        )
+        return leader.decode() if leader else None
+
+    def refresh(self, fingerprint: str, job_id: str):
+        """The leader is alive: keep accepting followers and push its deadline back"""
+        _, refresh, _, _ = self._scripts()
+        refresh(
+            keys=[f"{KEY_PREFIX}:inflight:{fingerprint}", f"{KEY_PREFIX}:followers:{job_id}", LEADERS_KEY],
+            args=[job_id, self._member(fingerprint, job_id), settings.coalesce_ttl_seconds, time.time()]
+        )
+
+    def release(self, fingerprint: str, job_id: str) -> List[Dict[str, Any]]:
+        """Close the leader to new followers and return the followers to fan out to.
+        Safe to call more than once; later calls return no followers."""
+        _, _, release, _ = self._scripts()
+        followers = release(
+            keys=[f"{KEY_PREFIX}:inflight:{fingerprint}", f"{KEY_PREFIX}:followers:{job_id}", LEADERS_KEY],
+            args=[job_id, self._member(fingerprint, job_id)]
+        )
+        return [json.loads(f) for f in followers]
+
+    def abandon(self, fingerprint: str, job_id: str):
+        """The leader could not be queued: stop new followers and let the next sweep fail the attached ones"""
+        _, _, _, abandon = self._scripts()
+        abandon(
+            keys=[f"{KEY_PREFIX}:inflight:{fingerprint}", LEADERS_KEY],
+            args=[job_id, self._member(fingerprint, job_id)]
+        )
+
+    def expired_leaders(self) -> List[Tuple[str, str]]:
+        """(fingerprint, job_id) of leaders past their deadline"""
+        members = get_redis().zrangebyscore(LEADERS_KEY, "-inf", time.time())
+        return [tuple(member.decode().split(":", 1)) for member in members]
+
+# Global coalescer instance
+check_coalescer = CheckCoalescer()
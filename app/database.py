@@ -1,15 +1,58 @@
-from sqlalchemy import create_engine, Column, String, DateTime, Float, Integer, Text, Boolean
+from sqlalchemy import create_engine, event, Column, String, DateTime, Float, Integer, Text, Boolean, Index, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from datetime import datetime
+from pathlib import Path
 from config import settings
 
-engine = create_engine(
-    settings.database_url,
-    connect_args={"check_same_thread": False},  # Fix SQLite thread safety
-    pool_pre_ping=True
-)
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+def _engine_options(url: str) -> dict:
+    """Pool settings per backend"""
+    if _is_sqlite(url):
+        # API threads and workers share the file; wait for the lock instead of failing at once
+        return {
+            "connect_args": {"check_same_thread": False, "timeout": settings.sqlite_busy_timeout_ms / 1000},
+            "pool_pre_ping": True
+        }
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": True
+    }
+
+def _configure_sqlite(dbapi_connection, connection_record):
+    """WAL lets readers run alongside the single writer; busy_timeout queues writers"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={settings.sqlite_busy_timeout_ms}")
+    cursor.close()
+
+engine = create_engine(settings.database_url, **_engine_options(settings.database_url))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def _async_database_url(url: str) -> str:
+    """Same database through its asyncio driver"""
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    if url.startswith(("postgresql://", "postgres://")):
+        return "postgresql+asyncpg://" + url.split("://", 1)[1]
+    return url
+
+# API request handlers use the async engine so queries don't block the event loop;
+# workers and scripts keep the sync SessionLocal
+async_engine = create_async_engine(_async_database_url(settings.database_url), **_engine_options(settings.database_url))
+AsyncSessionLocal = sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+if _is_sqlite(settings.database_url):
+    event.listen(engine, "connect", _configure_sqlite)
+    event.listen(async_engine.sync_engine, "connect", _configure_sqlite)
+
 Base = declarative_base()
 
 class Job(Base):
@@ -24,6 +67,86 @@ class Job(Base):
     result = Column(Text)
     error_message = Column(Text)
     api_key_owner = Column(String, nullable=True)  # Track which API key created this job
+    result_version = Column(Integer, nullable=False, default=0, server_default="0")  # Bumped when a backfill rewrites the result
+    
+    __table_args__ = (
+        # Tenant job listings: newest first, optionally filtered by status
+        Index("ix_jobs_owner_created", "api_key_owner", "created_at"),
+        Index("ix_jobs_owner_status", "api_key_owner", "status"),
+        # Archival scans for old completed jobs
+        Index("ix_jobs_status_completed", "status", "completed_at"),
+    )
+    
+    metrics = relationship("JobMetrics", uselist=False, viewonly=True)
+
+class JobMetrics(Base):
+    """Typed copy of the headline figures in a completed job's result, for filtering in SQL"""
+    __tablename__ = "job_metrics"
+    
+    job_id = Column(String, ForeignKey("jobs.id"), primary_key=True)
+    api_key_owner = Column(String, nullable=True)
+    completed_at = Column(DateTime)
+    challenge_status = Column(String, nullable=False)
+    max_drawdown_percent = Column(Float)
+    profit_percent = Column(Float)
+    total_trades = Column(Integer)
+    currency = Column(String)
+    violation_count = Column(Integer, default=0)
+    
+    violations = relationship("JobViolation", cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        Index("ix_job_metrics_owner_status", "api_key_owner", "challenge_status", "completed_at"),
+        Index("ix_job_metrics_owner_drawdown", "api_key_owner", "max_drawdown_percent"),
+    )
+    
+    @classmethod
+    def from_result(cls, job: "Job", result: dict) -> "JobMetrics":
+        """Build the metrics row (and its violation rows) from a CheckResponse dict"""
+        metrics = result.get("metrics", {})
+        rule_counts = {}
+        for violation in result.get("violations", []):
+            rule_counts[violation["rule"]] = rule_counts.get(violation["rule"], 0) + 1
+        
+        return cls(
+            job_id=job.id,
+            api_key_owner=job.api_key_owner,
+            completed_at=job.completed_at,
+            challenge_status=result["status"],
+            max_drawdown_percent=metrics.get("max_drawdown_percent"),
+            profit_percent=metrics.get("profit_percent"),
+            total_trades=metrics.get("total_trades"),
+            currency=metrics.get("currency"),
+            violation_count=sum(rule_counts.values()),
+            violations=[
+                JobViolation(job_id=job.id, api_key_owner=job.api_key_owner, rule=rule, count=count)
+                for rule, count in rule_counts.items()
+            ]
+        )
+
+class JobViolation(Base):
+    """One row per violated rule of a completed job"""
+    __tablename__ = "job_violations"
+    
+    job_id = Column(String, ForeignKey("job_metrics.job_id"), primary_key=True)
+    rule = Column(String, primary_key=True)
+    api_key_owner = Column(String, nullable=True)
+    count = Column(Integer, default=1)
+    
+    __table_args__ = (
+        Index("ix_job_violations_owner_rule", "api_key_owner", "rule"),
+    )
+
+class JobArchive(Base):
+    """Where an archived job's result lives: a zstd frame in a date-partitioned NDJSON file"""
+    __tablename__ = "job_archive"
+    
+    job_id = Column(String, ForeignKey("jobs.id"), primary_key=True)
+    path = Column(String, nullable=False)  # Relative to settings.archive_dir
+    frame_offset = Column(Integer, nullable=False)
+    frame_length = Column(Integer, nullable=False)
+    line = Column(Integer, nullable=False)  # Result's line within the decompressed frame
+    archived_at = Column(DateTime, default=datetime.utcnow)
 
 class ApiKey(Base):
     __tablename__ = "api_keys"
@@ -36,6 +159,10 @@ class ApiKey(Base):
     owner_email = Column(String, nullable=True)  # Track owner for multi-tenancy
     company = Column(String, nullable=True)  # Company name
     webhook_secret = Column(String, nullable=True)  # Per-API-key webhook secret
+    
+    __table_args__ = (
+        Index("ix_api_keys_owner_active", "owner_email", "active"),
+    )
 
 def get_db():
     db = SessionLocal()
@@ -44,8 +171,17 @@ def get_db():
     finally:
         db.close()
 
-try:
-    Base.metadata.create_all(bind=engine)
-except Exception as e:
-    print(f"Database initialization error: {e}")
-    raise
\ No newline at end of file
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def init_db():
+    """Bring the schema up to date by running the Alembic migrations"""
+    from alembic import command
+    from alembic.config import Config
+    
+    root = Path(__file__).resolve().parent.parent
+    config = Config(str(root / "alembic.ini"))
+    config.set_main_option("script_location", str(root / "migrations"))
+    config.attributes["configure_logger"] = False
+    command.upgrade(config, "head")
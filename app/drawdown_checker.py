@@ -1,15 +1,16 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable
 from datetime import datetime, timedelta
-import MetaTrader5 as mt5
 from app.models import Violation, ViolationType
 from app.mt5_client import MT5Client
+from app.mt5_backend import TIMEFRAME_M1
 import logging
 
 logger = logging.getLogger(__name__)
 
 class DrawdownChecker:
-    def __init__(self, mt5_client: MT5Client):
+    def __init__(self, mt5_client: MT5Client, progress: Optional[Callable[..., None]] = None):
         self.mt5_client = mt5_client
+        self.progress = progress or (lambda stage, **data: None)
     
     def check_drawdown(
         self, 
@@ -117,8 +118,12 @@ class DrawdownChecker:
         # Build timeline of all ticks/bars across all positions
         # This ensures we calculate combined floating P&L when positions overlap
         all_price_points = []  # List of (time, position_id, price, position_data)
+        report_every = max(1, len(positions) // 20)  # ~5% steps
         
-        for position in positions:
+        for index, position in enumerate(positions, 1):
+            if index % report_every == 0 or index == len(positions):
+                self.progress("positions", processed=index, total=len(positions))
+            
             if not position.get("open_time") or not position.get("close_time"):
                 logger.warning(f"Position {position.get('ticket')} missing open/close time, skipping")
                 continue
@@ -149,7 +154,7 @@ class DrawdownChecker:
             else:
                 # Fallback to 1-minute bars
                 logger.warning(f"Position {position['ticket']}: No ticks, using 1-min bars")
-                rates = self.mt5_client.get_rates(position["symbol"], mt5.TIMEFRAME_M1, start_time, end_time)
+                rates = self.mt5_client.get_rates(position["symbol"], TIMEFRAME_M1, start_time, end_time)
                 if rates is not None and len(rates) > 0:
                     for rate in rates:
                         rate_time = datetime.fromtimestamp(rate['time'])
@@ -0,0 +1,45 @@
+"""Encoders for streaming job exports; each batch of (row, result JSON) pairs becomes one chunk of output"""
+import csv
+import io
+import orjson
+from typing import AsyncIterator
+
+EXPORT_COLUMNS = [
+    "job_id", "user_id", "challenge_id", "status", "created_at", "completed_at",
+    "challenge_status", "max_drawdown_percent", "profit_percent", "total_trades",
+    "currency", "violation_count", "error"
+]
+
+def _fields(row) -> list:
+    return [
+        row.id, row.user_id, row.challenge_id, row.status,
+        row.created_at.isoformat() if row.created_at else None,
+        row.completed_at.isoformat() if row.completed_at else None,
+        row.challenge_status, row.max_drawdown_percent, row.profit_percent, row.total_trades,
+        row.currency, row.violation_count, row.error_message
+    ]
+
+async def ndjson_chunks(batches: AsyncIterator[list]) -> AsyncIterator[bytes]:
+    """One JSON object per job; the stored result JSON is spliced in without re-parsing"""
+    async for batch in batches:
+        lines = []
+        for row, result in batch:
+            line = orjson.dumps({column: value for column, value in zip(EXPORT_COLUMNS, _fields(row)) if value is not None})
+            if result:
+                line = line[:-1] + b',"result":' + result + b"}"
+            lines.append(line)
+        yield b"\n".join(lines) + b"\n"
+
+async def csv_chunks(batches: AsyncIterator[list]) -> AsyncIterator[bytes]:
+    """Flat metrics columns plus the full result as a JSON string column"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS + ["result"])
+    async for batch in batches:
+        for row, result in batch:
+            writer.writerow(_fields(row) + [result.decode() if result else None])
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
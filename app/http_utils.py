@@ -0,0 +1,56 @@
+"""Conditional GET and response compression helpers for the polling endpoints"""
+import hashlib
+from datetime import datetime
+from typing import Optional, Iterable, Tuple
+from starlette.middleware.gzip import GZipMiddleware
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:  # brotli is optional; gzip covers every client
+    BrotliMiddleware = None
+
+def _timestamp(value: Optional[datetime]) -> str:
+    return value.isoformat() if value else "-"
+
+def job_etag(job_id: str, status: str, completed_at: Optional[datetime], result_version: int = 0) -> str:
+    """Strong ETag for one job; a job's payload only changes with its status or a backfill of its result"""
+    digest = hashlib.sha1(f"{job_id}|{status}|{_timestamp(completed_at)}|{result_version}".encode()).hexdigest()[:20]
+    return f'"{digest}"'
+
+def list_etag(rows: Iterable[Tuple[str, str, Optional[datetime], int]], *extra) -> str:
+    """Strong ETag for a page of jobs from (id, status, completed_at, result_version) plus the query it answered"""
+    digest = hashlib.sha1()
+    for job_id, status, completed_at, result_version in rows:
+        digest.update(f"{job_id}|{status}|{_timestamp(completed_at)}|{result_version};".encode())
+    digest.update(repr(extra).encode())
+    return f'"{digest.hexdigest()[:20]}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match check (weak comparison, as RFC 9110 requires for it)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+class CompressionMiddleware:
+    """Brotli when installed, otherwise gzip; event streams are passed through untouched
+    because the compressors buffer small chunks and would hold SSE events back"""
+    def __init__(self, app, minimum_size: int = 1024):
+        self.app = app
+        if BrotliMiddleware is not None:
+            self.compressed = BrotliMiddleware(app, minimum_size=minimum_size, gzip_fallback=True)
+        else:
+            self.compressed = GZipMiddleware(app, minimum_size=minimum_size)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].endswith("/events"):
+            await self.app(scope, receive, send)
+        else:
+            await self.compressed(scope, receive, send)
@@ -0,0 +1,118 @@
+"""Hot copy of each job's current state in Redis.
+
+Whoever moves a job to a new state (the API on submit, workers afterwards)
+writes the whole state here. The status endpoint reads this hash and only
+goes to the database when it has expired or was never written.
+"""
+import logging
+from datetime import datetime
+from typing import Optional, Dict, Any, Union
+from app.redis_client import get_redis, get_async_redis
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+STATE_FIELDS = ("owner", "status", "created_at", "completed_at", "error", "version")
+
+def job_key(job_id: str) -> str:
+    return f"brymix:job:{job_id}"
+
+class JobState:
+    """Status fields of a cached job, shaped like a row of JobRepository.get_state_for_owner"""
+    def __init__(self, job_id: str, fields: Dict[str, str]):
+        self.id = job_id
+        self.owner = fields["owner"] or None
+        self.status = fields["status"]
+        self.created_at = datetime.fromisoformat(fields["created_at"])
+        self.completed_at = datetime.fromisoformat(fields["completed_at"]) if fields["completed_at"] else None
+        self.error_message = fields["error"] or None
+        self.result_version = int(fields["version"] or 0)
+
+class JobStateCache:
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def _mapping(
+        owner: Optional[str],
+        status: str,
+        created_at: datetime,
+        completed_at: Optional[datetime] = None,
+        error: Optional[str] = None,
+        result: Optional[Union[str, bytes]] = None,
+        result_version: int = 0
+    ) -> Dict[str, Any]:
+        mapping = {
+            "owner": owner or "",
+            "status": status,
+            "created_at": created_at.isoformat(),
+            "completed_at": completed_at.isoformat() if completed_at else "",
+            "error": error or "",
+            "version": result_version or 0
+        }
+        if result is not None:
+            mapping["result"] = result
+        return mapping
+
+    def _write(self, pipe, job_id: str, mapping: Dict[str, Any]):
+        pipe.delete(job_key(job_id))
+        # One field per HSET: multi-field HSET needs Redis 4, the bundled Windows Redis is 3.0
+        for field, value in mapping.items():
+            pipe.hset(job_key(job_id), field, value)
+        pipe.expire(job_key(job_id), self.ttl_seconds)
+
+    def store(self, job_id: str, owner: Optional[str], status: str, created_at: datetime, **fields):
+        """Write a job's state from a worker; a failure only costs a database read later"""
+        try:
+            pipe = get_redis().pipeline(transaction=True)
+            self._write(pipe, job_id, self._mapping(owner, status, created_at, **fields))
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to cache state of job {job_id}: {e}")
+            # An older cached state would otherwise be served until it expires
+            try:
+                get_redis().delete(job_key(job_id))
+            except Exception as e:
+                logger.error(f"Failed to evict stale cached state of job {job_id}: {e}")
+
+    def store_job(self, job, result: Optional[Union[str, bytes]] = None):
+        """store() from a Job row"""
+        self.store(
+            job.id, job.api_key_owner, job.status, job.created_at,
+            completed_at=job.completed_at, error=job.error_message, result=result,
+            result_version=job.result_version
+        )
+
+    async def store_async(self, job_id: str, owner: Optional[str], status: str, created_at: datetime, **fields):
+        """store() for API handlers"""
+        try:
+            pipe = get_async_redis().pipeline(transaction=True)
+            self._write(pipe, job_id, self._mapping(owner, status, created_at, **fields))
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to cache state of job {job_id}: {e}")
+            try:
+                await get_async_redis().delete(job_key(job_id))
+            except Exception as e:
+                logger.error(f"Failed to evict stale cached state of job {job_id}: {e}")
+
+    async def get_state(self, job_id: str) -> Optional[JobState]:
+        """Cached status fields (not the result), or None on a miss"""
+        try:
+            values = await get_async_redis().hmget(job_key(job_id), *STATE_FIELDS)
+        except Exception as e:
+            logger.warning(f"Job cache unavailable: {e}")
+            return None
+        if values[1] is None:
+            return None
+        return JobState(job_id, {field: (value or b"").decode() for field, value in zip(STATE_FIELDS, values)})
+
+    async def get_result(self, job_id: str) -> Optional[bytes]:
+        try:
+            return await get_async_redis().hget(job_key(job_id), "result")
+        except Exception as e:
+            logger.warning(f"Job cache unavailable: {e}")
+            return None
+
+# Global cache instance
+job_cache = JobStateCache(settings.job_cache_ttl_seconds)
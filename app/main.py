@@ -1,22 +1,37 @@
-from fastapi import FastAPI, HTTPException, Header, Depends, Request
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi import FastAPI, HTTPException, Header, Depends, Request, Query
+from fastapi.responses import JSONResponse, ORJSONResponse, FileResponse, StreamingResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
+import asyncio
+import math
 import uuid
 import logging
-from datetime import datetime
-import json
+from datetime import datetime, timedelta
+import orjson
 import re
 from pydantic import BaseModel
 
-from app.models import CheckRequest, JobResponse, CheckResponse
-from app.database import get_db, Job, ApiKey
-from app.celery_worker import process_challenge_check
-from app.rule_checker import RuleChecker
-from app.mt5_client import MT5Client
-from app.security import rate_limit_middleware, generate_secure_key, SecurityManager
+from app.models import CheckRequest, JobResponse, CheckResponse, BatchCheckRequest, BatchCheckResponse, BatchRejection, JobStatus, ChallengeStatus, ViolationType
+from app.database import get_async_db, init_db, AsyncSessionLocal, Job, ApiKey
+from app.repository import ApiKeyRepository, JobRepository, encode_cursor, decode_cursor
+from app.sync_executor import sync_check_executor, ExecutorSaturated
+from app.api_key_cache import api_key_cache, CachedApiKey, publish_invalidation, listen_for_invalidations
+from app.celery_app import send_dispatch_token
+from app.scheduler import fair_scheduler
+from app.coalescer import check_coalescer
+from app.terminal_router import terminal_router
+from app import progress
+from app.progress import progress_publisher
+from app.status_writer import status_writer
+from app.job_cache import job_cache
+from app import export
+from app.archive import job_archiver
+from app.admission import admission_controller, AdmissionRejected
+from app.http_utils import CompressionMiddleware, job_etag, list_etag, etag_matches
+from app.analytics import job_analytics
+from app.security import redis_rate_limiter, resolve_rate_limit, generate_secure_key, hash_api_key, SecurityManager
 from config import settings
 
 # Setup logging
@@ -30,20 +45,75 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="Brymix Propfirm Challenge Checker",
     description="API for validating propfirm trading challenges",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=ORJSONResponse
 )
 
+# Results and job lists compress well; small responses aren't worth it
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
+@app.middleware("http")
+async def rate_limit_middleware(request: Request, call_next):
+    """Per-API-key, per-endpoint limits shared across all API processes"""
+    api_key = request.headers.get("X-API-Key")
+    if not api_key:
+        return await call_next(request)
+    
+    key_hash = hash_api_key(api_key)
+    # Tenant overrides apply once the key has been verified (and cached) by a handler
+    cached = api_key_cache.get(key_hash)
+    overrides = settings.rate_limit_overrides.get(cached.owner_email) if cached else None
+    scope, limit = resolve_rate_limit(
+        request.url.path,
+        settings.rate_limit_per_minute,
+        settings.rate_limit_endpoints,
+        overrides
+    )
+    
+    result = await redis_rate_limiter.hit(f"{key_hash}:{scope}", limit)
+    if not result.allowed:
+        return JSONResponse(
+            status_code=429,
+            content={"detail": "Rate limit exceeded"},
+            headers={**result.headers(), "Retry-After": str(max(1, 60 // limit))}
+        )
+    
+    # Handlers that do more than one request's work charge the rest to the same bucket
+    request.state.rate_limit = (f"{key_hash}:{scope}", limit)
+    response = await call_next(request)
+    response.headers.update(getattr(request.state, "rate_limit_result", result).headers())
+    return response
+
 # Initialize security manager
 security_manager = SecurityManager(settings.encryption_key)
 
-# Legacy MT5 client for sync endpoint
-mt5_client = MT5Client(settings.mt5_path, settings.mt5_timeout)
+# Legacy MT5 client for sync endpoint, created on first use
+_mt5_client = None
+
+def get_mt5_client():
+    """Load MetaTrader5 only when a sync check actually needs a terminal"""
+    global _mt5_client
+    if _mt5_client is None:
+        from app.mt5_client import MT5Client
+        _mt5_client = MT5Client(settings.mt5_path, settings.mt5_timeout)
+    return _mt5_client
 
-def verify_api_key(x_api_key: str, db: Session) -> ApiKey:
+async def verify_api_key(x_api_key: str, db: AsyncSession) -> Optional[CachedApiKey]:
     if not x_api_key:
         return None
-    api_key = db.query(ApiKey).filter(ApiKey.key == x_api_key, ApiKey.active == True).first()
-    return api_key
+    
+    key_hash = hash_api_key(x_api_key)
+    cached = api_key_cache.get(key_hash)
+    if cached:
+        return cached
+    
+    api_key = await ApiKeyRepository.get_active(db, x_api_key)
+    if not api_key:
+        return None
+    
+    cached = CachedApiKey.from_model(api_key)
+    api_key_cache.put(key_hash, cached)
+    return cached
 
 def sanitize_for_log(value: str) -> str:
     """Sanitize string for safe logging"""
@@ -70,7 +140,7 @@ class DeleteApiKeyRequest(BaseModel):
 @app.post("/api/v1/register")
 async def register_propfirm(
     request: RegisterRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Register a new propfirm and generate API key"""
     import secrets
@@ -88,8 +158,7 @@ async def register_propfirm(
         company=request.company,
         webhook_secret=webhook_secret
     )
-    db.add(new_key)
-    db.commit()
+    await ApiKeyRepository.add(db, new_key)
     
     logger.info(f"New propfirm registered: {sanitize_for_log(request.company)}")
     
@@ -111,7 +180,7 @@ async def root():
 @app.post("/api/v1/dashboard/create-key")
 async def create_dashboard_api_key(
     request: DashboardApiKeyRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create API key for dashboard user"""
     try:
@@ -129,8 +198,7 @@ async def create_dashboard_api_key(
         )
         
         logger.info(f"Adding API key to database")
-        db.add(new_key)
-        db.commit()
+        await ApiKeyRepository.add(db, new_key)
         
         logger.info(f"API key created successfully: {api_key[:12]}...")
         
@@ -143,26 +211,23 @@ async def create_dashboard_api_key(
         }
     except Exception as e:
         logger.error(f"Dashboard API key creation failed: {str(e)}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @app.delete("/api/v1/dashboard/delete-key")
 async def delete_dashboard_api_key(
     request: DeleteApiKeyRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete API key (dashboard only)"""
-    api_key = db.query(ApiKey).filter(
-        ApiKey.key == request.api_key,
-        ApiKey.owner_email == request.owner_email,
-        ApiKey.active == True
-    ).first()
+    api_key = await ApiKeyRepository.get_active_for_owner(db, request.api_key, request.owner_email)
     
     if not api_key:
         raise HTTPException(status_code=404, detail="API key not found or unauthorized")
     
     api_key.active = False
-    db.commit()
+    await db.commit()
+    publish_invalidation(request.api_key)
     
     logger.info(f"API key deleted for: {sanitize_for_log(request.owner_email)}")
     
@@ -171,15 +236,12 @@ async def delete_dashboard_api_key(
 @app.get("/api/v1/dashboard/keys/{owner_email}")
 async def get_user_api_keys(
     owner_email: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all API keys for a user"""
     try:
         logger.info(f"Getting API keys for: {owner_email}")
-        keys = db.query(ApiKey).filter(
-            ApiKey.owner_email == owner_email,
-            ApiKey.active == True
-        ).all()
+        keys = await ApiKeyRepository.list_active_for_owner(db, owner_email)
         
         logger.info(f"Found {len(keys)} keys for {owner_email}")
         
@@ -213,13 +275,64 @@ async def health_check():
 async def create_check(
     request: CheckRequest,
     x_api_key: Optional[str] = Header(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Submit challenge check - queued processing"""
-    api_key_obj = verify_api_key(x_api_key, db)
+    api_key_obj = await verify_api_key(x_api_key, db)
     if not api_key_obj:
         raise HTTPException(status_code=401, detail="Invalid API key")
     
+    try:
+        return await _submit_check(request, api_key_obj, db)
+    except AdmissionRejected as e:
+        logger.warning(f"Rejected check for {api_key_obj.owner_email}: {e.detail}")
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
+
+@app.post("/api/v1/check/batch", response_model=BatchCheckResponse)
+async def create_check_batch(
+    request: BatchCheckRequest,
+    http_request: Request,
+    x_api_key: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Submit up to 100 checks in one request; checks refused by admission control are listed in rejected"""
+    api_key_obj = await verify_api_key(x_api_key, db)
+    if not api_key_obj:
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    
+    # Each check costs what a single submission does; the middleware charged the first
+    rate_limit = getattr(http_request.state, "rate_limit", None)
+    if rate_limit and len(request.checks) > 1:
+        key, limit = rate_limit
+        result = await redis_rate_limiter.hit(key, limit, cost=len(request.checks) - 1)
+        http_request.state.rate_limit_result = result
+        if not result.allowed:
+            # Time to refill the missing tokens at limit/60 per second
+            missing = len(request.checks) - 1 - result.remaining
+            raise HTTPException(
+                status_code=429,
+                detail="Rate limit exceeded",
+                headers={**result.headers(), "Retry-After": str(max(1, math.ceil(missing * 60 / limit)))}
+            )
+    
+    jobs = []
+    rejected = []
+    for index, check in enumerate(request.checks):
+        try:
+            jobs.append(await _submit_check(check, api_key_obj, db))
+        except AdmissionRejected as e:
+            rejected.append(BatchRejection(index=index, status_code=e.status_code, detail=e.detail, retry_after=e.retry_after))
+    
+    if rejected:
+        logger.warning(f"Rejected {len(rejected)} of {len(request.checks)} batched checks for {api_key_obj.owner_email}")
+    return BatchCheckResponse(jobs=jobs, rejected=rejected)
+
+async def _submit_check(request: CheckRequest, api_key_obj: CachedApiKey, db: AsyncSession) -> JobResponse:
+    """Admit, record and queue one check; raises AdmissionRejected when the queue is too deep"""
+    estimated_completion = None
+    if settings.admission_enabled:
+        estimated_completion = await admission_controller.admit(api_key_obj.owner_email)
+    
     job_id = f"job_{uuid.uuid4().hex[:12]}"
     
     # Create job record with owner tracking
@@ -230,40 +343,132 @@ async def create_check(
         status="pending",
         api_key_owner=api_key_obj.owner_email
     )
-    db.add(job)
-    db.commit()
+    await JobRepository.add(db, job)
+    await job_cache.store_async(job_id, api_key_obj.owner_email, "pending", job.created_at)
     
-    # Queue Celery task with job_id
-    process_challenge_check.delay(job_id, request.model_dump())
+    job_data = request.model_dump(mode='json')
+    fingerprint = check_coalescer.fingerprint(api_key_obj.owner_email, job_data)
+    try:
+        # Coalescing, scheduling and the dispatch token are blocking Redis/broker calls
+        leader_id = await asyncio.get_running_loop().run_in_executor(
+            None, _queue_check, api_key_obj.owner_email, request, job_id, job_data, fingerprint
+        )
+    except Exception as e:
+        logger.error(f"Failed to queue job {job_id}: {e}")
+        job.status = "failed"
+        job.error_message = "Check could not be queued"
+        job.completed_at = datetime.utcnow()
+        await db.commit()
+        await job_cache.store_async(
+            job_id, api_key_obj.owner_email, job.status, job.created_at,
+            completed_at=job.completed_at, error=job.error_message
+        )
+        raise HTTPException(status_code=503, detail="Check could not be queued - retry later", headers={"Retry-After": "5"})
+    if leader_id:
+        return JobResponse(
+            job_id=job_id,
+            status="pending",
+            message=f"Attached to in-flight check {leader_id}",
+            estimated_completion_time=estimated_completion
+        )
     
     logger.info(f"Queued job {job_id} for user {sanitize_for_log(request.user_id)}")
     
     return JobResponse(
         job_id=job_id,
         status="pending",
-        message="Check queued successfully"
+        message="Check queued successfully",
+        estimated_completion_time=estimated_completion
     )
 
+def _queue_check(tenant: str, request: CheckRequest, job_id: str, job_data: dict, fingerprint: str) -> Optional[str]:
+    """Attach to an identical in-flight check or schedule this one; returns the leader's job_id when attached"""
+    # Same account and rules already in flight: ride along instead of running again
+    leader_id = check_coalescer.attach_or_claim(fingerprint, job_id, request.callback_url)
+    if leader_id:
+        logger.info(f"Job {job_id} attached to in-flight job {leader_id}")
+        progress_publisher.publish(job_id, tenant, "queued", coalesced_with=leader_id)
+        return leader_id
+    
+    # Queue in the tenant's fair-share queue; the token lets the next free worker pick fairly
+    try:
+        fair_scheduler.enqueue(tenant, request.priority, job_id, job_data)
+    except Exception:
+        # This leader will never run; workers fail anything that attached to it meanwhile
+        try:
+            check_coalescer.abandon(fingerprint, job_id)
+        except Exception as e:
+            logger.error(f"Failed to abandon coalescing leader {job_id}: {e}")
+        raise
+    queue = terminal_router.route()
+    try:
+        send_dispatch_token(queue)
+    except Exception as e:
+        # Already scheduled: pinned workers re-send tokens for jobs that have none
+        logger.error(f"Failed to send dispatch token for job {job_id}: {e}")
+        terminal_router.token_unsent(queue)
+    progress_publisher.publish(job_id, tenant, "queued", priority=request.priority.value)
+    return None
+
+MAX_LONG_POLL_SECONDS = 60
+
+async def _load_result(db: AsyncSession, job_id: str):
+    """Stored result JSON from the jobs table, or from the archive files once it has been archived"""
+    result = await JobRepository.get_result(db, job_id)
+    if result is None:
+        location = await JobRepository.get_archive_location(db, job_id)
+        if location:
+            result = await asyncio.get_running_loop().run_in_executor(None, job_archiver.read_result, location)
+    return result
+
+async def _load_job_state(db: AsyncSession, job_id: str, owner_email: Optional[str]):
+    """Job status fields from the Redis hot cache, or the database on a miss; None if not this tenant's"""
+    job = await job_cache.get_state(job_id)
+    if job:
+        return job if job.owner == owner_email else None
+    
+    job = await JobRepository.get_state_for_owner(db, job_id, owner_email)
+    if job and job.status in progress.TERMINAL_STAGES:
+        # Final states never change, so they are safe to re-cache from here
+        result = await _load_result(db, job_id)
+        await job_cache.store_async(
+            job.id, owner_email, job.status, job.created_at,
+            completed_at=job.completed_at, error=job.error_message, result=result,
+            result_version=job.result_version
+        )
+    return job
+
 @app.get("/api/v1/job/{job_id}")
 async def get_job_status(
     job_id: str,
     x_api_key: Optional[str] = Header(None),
-    db: Session = Depends(get_db)
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+    wait: int = 0
 ):
-    """Get job status"""
-    api_key_obj = verify_api_key(x_api_key, db)
+    """Get job status; with ?wait=N, hold the request up to N seconds until the job finishes.
+    Send the last ETag as If-None-Match to get 304 when nothing changed."""
+    api_key_obj = await verify_api_key(x_api_key, db)
     if not api_key_obj:
         raise HTTPException(status_code=401, detail="Invalid API key")
     
     # Multi-tenant: only show jobs owned by this API key
-    job = db.query(Job).filter(
-        Job.id == job_id,
-        Job.api_key_owner == api_key_obj.owner_email
-    ).first()
+    job = await _load_job_state(db, job_id, api_key_obj.owner_email)
     
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
     
+    if wait > 0 and job.status not in progress.TERMINAL_STAGES:
+        # Give the connection back to the pool while we wait
+        await db.commit()
+        if await progress.wait_for_terminal(job_id, min(wait, MAX_LONG_POLL_SECONDS)):
+            job = await _load_job_state(db, job_id, api_key_obj.owner_email)
+    
+    etag = job_etag(job.id, job.status, job.completed_at, job.result_version)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    
     response = {
         "job_id": job.id,
         "status": job.status,
@@ -273,31 +478,126 @@ async def get_job_status(
     if job.completed_at:
         response["completed_at"] = job.completed_at.isoformat()
     
-    if job.result:
-        response["result"] = json.loads(job.result)
-    
     if job.error_message:
         response["error"] = job.error_message
     
-    return response
+    body = orjson.dumps(response)
+    if job.status == JobStatus.COMPLETED.value:
+        result = await job_cache.get_result(job_id) or await _load_result(db, job_id)
+        if result:
+            # The stored result is already JSON; splice it in instead of parsing and re-encoding it
+            if isinstance(result, str):
+                result = result.encode()
+            body = body[:-1] + b',"result":' + result + b"}"
+    
+    return Response(body, media_type="application/json", headers=headers)
+
+@app.get("/api/v1/job/{job_id}/events")
+async def stream_job_events(
+    job_id: str,
+    x_api_key: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Server-Sent Events stream of one job's progress, closed when it finishes"""
+    api_key_obj = await verify_api_key(x_api_key, db)
+    if not api_key_obj:
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    
+    job = await JobRepository.get_state_for_owner(db, job_id, api_key_obj.owner_email)
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    pubsub = await progress.subscribe(progress.job_channel(job_id))
+    initial = []
+    last = await progress.last_event(job_id)
+    if last:
+        initial.append(last)
+    elif job.status in progress.TERMINAL_STAGES:
+        # Finished before events were kept (or the last event expired)
+        initial.append({"job_id": job_id, "stage": job.status})
+    
+    # The stream can stay open for minutes; don't hold a database connection for it
+    await db.close()
+    
+    return StreamingResponse(
+        progress.stream_events(pubsub, initial, close_on_terminal=True),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/v1/events")
+async def stream_api_key_events(
+    x_api_key: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Server-Sent Events stream of progress for every job of this API key's owner"""
+    api_key_obj = await verify_api_key(x_api_key, db)
+    if not api_key_obj:
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    
+    pubsub = await progress.subscribe(progress.tenant_channel(api_key_obj.owner_email))
+    await db.close()
+    
+    return StreamingResponse(
+        progress.stream_events(pubsub, [], close_on_terminal=False),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/v1/queue")
+async def get_queue_status(
+    x_api_key: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Queue depth and wait times for this API key's tenant"""
+    api_key_obj = await verify_api_key(x_api_key, db)
+    if not api_key_obj:
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    
+    return await asyncio.get_running_loop().run_in_executor(None, fair_scheduler.tenant_stats, api_key_obj.owner_email)
+
+@app.get("/api/v1/terminals")
+async def get_terminal_status(
+    x_api_key: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Per-terminal queue length and utilisation"""
+    api_key_obj = await verify_api_key(x_api_key, db)
+    if not api_key_obj:
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    
+    return {"terminals": await asyncio.get_running_loop().run_in_executor(None, terminal_router.stats)}
 
 @app.post("/api/v1/check/sync", response_model=CheckResponse)
 async def create_check_sync(
     request: CheckRequest,
     x_api_key: Optional[str] = Header(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Synchronous check (legacy)"""
-    api_key_obj = verify_api_key(x_api_key, db)
+    api_key_obj = await verify_api_key(x_api_key, db)
     if not api_key_obj:
         raise HTTPException(status_code=401, detail="Invalid API key")
     
+    try:
+        from app.rule_checker import RuleChecker
+        rule_checker = RuleChecker(get_mt5_client())
+    except ImportError as e:
+        logger.warning(f"Sync check unavailable: {e}")
+        raise HTTPException(status_code=503, detail="No MT5 terminal on this host - use /api/v1/check")
+    
     job_id = f"job_{uuid.uuid4().hex[:12]}"
     
     try:
-        rule_checker = RuleChecker(mt5_client)
-        result = rule_checker.check_challenge(request, job_id)
-        return result
+        # Blocking MT5 IPC and curve building run off the event loop, with a cap
+        return await sync_check_executor.run(rule_checker.check_challenge, request, job_id)
+    except ExecutorSaturated as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Synchronous check capacity exhausted - retry later or use /api/v1/check",
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
         logger.error(f"Sync check failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -305,20 +605,55 @@ async def create_check_sync(
 @app.get("/api/v1/jobs")
 async def list_jobs(
     x_api_key: Optional[str] = Header(None),
-    db: Session = Depends(get_db),
-    limit: int = 50
+    db: AsyncSession = Depends(get_async_db),
+    limit: int = Query(50, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    status: Optional[JobStatus] = None,
+    challenge_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    if_none_match: Optional[str] = Header(None),
+    challenge_status: Optional[ChallengeStatus] = None,
+    violation_type: Optional[ViolationType] = None,
+    min_drawdown_percent: Optional[float] = None
 ):
-    """List recent jobs (multi-tenant)"""
-    api_key_obj = verify_api_key(x_api_key, db)
+    """List jobs newest first (multi-tenant); pass next_cursor back as ?cursor= for the next page"""
+    api_key_obj = await verify_api_key(x_api_key, db)
     if not api_key_obj:
         raise HTTPException(status_code=401, detail="Invalid API key")
     
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
     # Multi-tenant: only show jobs owned by this API key
-    jobs = db.query(Job).filter(
-        Job.api_key_owner == api_key_obj.owner_email
-    ).order_by(Job.created_at.desc()).limit(limit).all()
+    jobs, next_cursor = await JobRepository.list_for_owner(
+        db,
+        api_key_obj.owner_email,
+        limit,
+        cursor=after,
+        status=status.value if status else None,
+        challenge_id=challenge_id,
+        user_id=user_id,
+        created_from=created_from,
+        created_to=created_to,
+        challenge_status=challenge_status.value if challenge_status else None,
+        violation_type=violation_type.value if violation_type else None,
+        min_drawdown_percent=min_drawdown_percent
+    )
     
-    return {
+    etag = list_etag(
+        ((job.id, job.status, job.completed_at, job.result_version) for job in jobs),
+        limit, cursor, status, challenge_id, user_id, created_from, created_to,
+        challenge_status, violation_type, min_drawdown_percent
+    )
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    
+    return ORJSONResponse({
         "jobs": [
             {
                 "id": job.id,
@@ -326,27 +661,119 @@ async def list_jobs(
                 "challenge_id": job.challenge_id,
                 "status": job.status,
                 "created_at": job.created_at.isoformat(),
-                "completed_at": job.completed_at.isoformat() if job.completed_at else None
+                "completed_at": job.completed_at.isoformat() if job.completed_at else None,
+                "challenge_status": job.metrics.challenge_status if job.metrics else None,
+                "max_drawdown_percent": job.metrics.max_drawdown_percent if job.metrics else None,
+                "profit_percent": job.metrics.profit_percent if job.metrics else None
             }
             for job in jobs
-        ]
-    }
+        ],
+        "next_cursor": encode_cursor(next_cursor) if next_cursor else None
+    }, headers=headers)
+
+EXPORT_BATCH_SIZE = 500
+
+@app.get("/api/v1/export")
+async def export_jobs(
+    x_api_key: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    status: Optional[JobStatus] = None,
+    challenge_status: Optional[ChallengeStatus] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None
+):
+    """Stream every job of this API key's tenant, with results, as NDJSON or CSV (oldest first)"""
+    api_key_obj = await verify_api_key(x_api_key, db)
+    if not api_key_obj:
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    await db.close()
+    
+    async def batches():
+        # Own session: it has to live as long as the response body, not the handler
+        async with AsyncSessionLocal() as export_db:
+            async for batch in JobRepository.stream_for_owner(
+                export_db,
+                api_key_obj.owner_email,
+                EXPORT_BATCH_SIZE,
+                status=status.value if status else None,
+                challenge_status=challenge_status.value if challenge_status else None,
+                created_from=created_from,
+                created_to=created_to
+            ):
+                results = [row.result.encode() if row.result else None for row in batch]
+                # Results moved to the archive are read back a frame at a time, off the event loop
+                archived = [i for i, row in enumerate(batch) if row.result is None and row.path]
+                if archived:
+                    locations = [(batch[i].path, batch[i].frame_offset, batch[i].frame_length, batch[i].line) for i in archived]
+                    restored = await asyncio.get_running_loop().run_in_executor(None, job_archiver.read_results, locations)
+                    for i, result in zip(archived, restored):
+                        results[i] = result
+                yield list(zip(batch, results))
+    
+    if format == "csv":
+        body, media_type = export.csv_chunks(batches()), "text/csv"
+    else:
+        body, media_type = export.ndjson_chunks(batches()), "application/x-ndjson"
+    
+    filename = f"brymix-jobs-{datetime.utcnow():%Y%m%d%H%M%S}.{format}"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+ANALYTICS_PERIODS = {"1d": timedelta(days=1), "7d": timedelta(days=7), "30d": timedelta(days=30), "90d": timedelta(days=90)}
+
+@app.get("/api/v1/analytics")
+async def get_analytics(
+    x_api_key: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+    period: str = Query("7d", pattern="^(1d|7d|30d|90d)$"),
+    granularity: Optional[str] = Query(None, pattern="^(hour|day)$")
+):
+    """Job volume, pass rate, violations and latency for a period, from precomputed rollups"""
+    api_key_obj = await verify_api_key(x_api_key, db)
+    if not api_key_obj:
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    
+    granularity = granularity or ("hour" if period == "1d" else "day")
+    # Rollups are bucketed by completed_at, which is naive UTC
+    end = datetime.utcnow()
+    start = end - ANALYTICS_PERIODS[period]
+    if granularity == "hour":
+        start = start.replace(minute=0, second=0, microsecond=0)
+    else:
+        start = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    
+    try:
+        analytics = await job_analytics.query(api_key_obj.owner_email, granularity, start, end)
+    except Exception as e:
+        logger.error(f"Analytics query failed: {str(e)}")
+        raise HTTPException(status_code=503, detail="Analytics temporarily unavailable")
+    
+    # Unfinished jobs aren't in the rollups; count them live
+    analytics["in_flight"] = await JobRepository.count_by_status(
+        db, api_key_obj.owner_email, [JobStatus.PENDING.value, JobStatus.PROCESSING.value]
+    )
+    analytics["period"]["start"] = start.isoformat()
+    analytics["period"]["end"] = end.isoformat()
+    return analytics
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize on startup"""
     logger.info("Starting Brymix Challenge Checker API v2.0")
-    
-    try:
-        if not mt5_client.initialize():
-            logger.warning("Failed to initialize MT5 - continuing without MT5")
-        else:
-            logger.info("MT5 initialized successfully")
-    except Exception as e:
-        logger.warning(f"MT5 startup failed: {str(e)} - continuing without MT5")
+    if settings.db_migrate_on_startup:
+        init_db()
+    app.state.invalidation_listener = asyncio.create_task(listen_for_invalidations())
+    status_writer.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info("Shutting down Brymix Challenge Checker API")
-    mt5_client.shutdown()
\ No newline at end of file
+    app.state.invalidation_listener.cancel()
+    status_writer.stop()
+    if _mt5_client:
+        _mt5_client.shutdown()
\ No newline at end of file
@@ -9,6 +9,10 @@ class JobStatus(str, Enum):
     COMPLETED = "completed"
     FAILED = "failed"
 
+class CheckPriority(str, Enum):
+    INTERACTIVE = "interactive"
+    BULK = "bulk"
+
 class ChallengeStatus(str, Enum):
     PASSED = "passed"
     FAILED = "failed"
@@ -32,6 +36,7 @@ class CheckRequest(BaseModel):
     initial_balance: float = Field(..., gt=0)
     rules: Rules
     callback_url: str
+    priority: CheckPriority = CheckPriority.INTERACTIVE
     
     @validator('callback_url')
     def validate_callback_url(cls, v):
@@ -82,3 +87,17 @@ class JobResponse(BaseModel):
     job_id: str
     status: JobStatus
     message: str
+    estimated_completion_time: Optional[datetime] = None
+
+class BatchCheckRequest(BaseModel):
+    checks: List[CheckRequest] = Field(..., min_length=1, max_length=100)
+
+class BatchRejection(BaseModel):
+    index: int  # Position in the submitted checks list
+    status_code: int
+    detail: str
+    retry_after: int
+
+class BatchCheckResponse(BaseModel):
+    jobs: List[JobResponse]
+    rejected: List[BatchRejection] = []
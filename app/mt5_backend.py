@@ -0,0 +1,428 @@
+"""Backends behind MT5Client and MT5Pool.
+
+The client and pool talk to a terminal through the calls the MetaTrader5
+module exposes: initialize, login, account_info, history_deals_get,
+symbol_info, copy_ticks_range, copy_rates_range and so on. The live
+backend is that module itself. The other two backends answer the same calls:
+
+- FakeBackend serves accounts from recorded fixture files or a seeded
+  synthetic market. It can add lognormally distributed latency to every
+  call (and a separate one to login) to stand in for terminal IPC, so
+  checks run on hosts without a terminal.
+- RecordingBackend wraps the live module and saves what an account session
+  returned as a fixture for FakeBackend.
+
+A fixture is one JSON file per login, <fixture_dir>/<login>.json:
+{"account": {...}, "deals": [...], "symbols": {name: {...}},
+ "ticks": {name: [...]}, "rates": {name: [...]}}
+"""
+import bisect
+import importlib
+import logging
+import math
+import random
+import time
+import orjson
+from collections import namedtuple
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# MetaTrader5 constants used by the checkers
+TIMEFRAME_M1 = 1
+COPY_TICKS_ALL = -1
+DEAL_TYPE_BUY = 0
+DEAL_TYPE_SELL = 1
+DEAL_TYPE_BALANCE = 2
+DEAL_ENTRY_IN = 0
+DEAL_ENTRY_OUT = 1
+
+AccountInfo = namedtuple(
+    "AccountInfo",
+    ["login", "balance", "equity", "profit", "margin", "margin_free", "currency", "server"],
+    defaults=[0, 0.0, 0.0, 0.0, 0.0, 0.0, "USD", ""]
+)
+TradeDeal = namedtuple(
+    "TradeDeal",
+    ["ticket", "order", "time", "time_msc", "type", "entry", "magic", "position_id", "reason",
+     "volume", "price", "commission", "swap", "profit", "fee", "symbol", "comment", "external_id"],
+    defaults=[0, 0, 0, 0, 0, 0, 0, 0, 0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, "", "", ""]
+)
+SymbolInfo = namedtuple(
+    "SymbolInfo",
+    ["name", "point", "digits", "trade_contract_size", "currency_base", "currency_profit"],
+    defaults=["", 0.00001, 5, 100000.0, "", "USD"]
+)
+
+def _record(cls, data: dict):
+    return cls(**{key: value for key, value in data.items() if key in cls._fields})
+
+def _as_dict(record) -> dict:
+    """Plain dict from a MetaTrader5 namedtuple, numpy structured row or dict"""
+    if hasattr(record, "_asdict"):
+        return dict(record._asdict())
+    if getattr(record, "dtype", None) is not None:
+        return {name: record[name].item() for name in record.dtype.names}
+    return dict(record)
+
+def _timestamp(value) -> float:
+    return value.timestamp() if isinstance(value, datetime) else float(value)
+
+# Synthetic market: price, point, digits, contract size, volatility per sqrt(second)
+SYNTHETIC_SYMBOLS = {
+    "EURUSD": (1.0850, 0.00001, 5, 100000.0, 0.00002, "EUR"),
+    "GBPUSD": (1.2700, 0.00001, 5, 100000.0, 0.00003, "GBP"),
+    "XAUUSD": (2350.00, 0.01, 2, 100.0, 0.05, "XAU"),
+}
+SYNTHETIC_START = datetime(2024, 1, 1)
+
+def synthetic_account(
+    login,
+    seed: int = 0,
+    positions: int = 50,
+    min_hold_seconds: int = 60,
+    max_hold_seconds: int = 3600,
+    max_open: int = 1,
+    symbols: Sequence[str] = ("EURUSD", "GBPUSD", "XAUUSD"),
+    tick_seconds: int = 5,
+    initial_balance: float = 100000.0,
+    volume: tuple = (0.1, 2.0)
+) -> dict:
+    """Fixture for a seeded random-walk market; the same arguments always give the same account.
+
+    max_open is roughly how many positions overlap, e.g. a hedger holding
+    opposite positions on one symbol.
+    """
+    rng = random.Random(f"{seed}:{login}")
+    start = _timestamp(SYNTHETIC_START) + rng.randrange(86400)
+
+    # Position windows; with max_open > 1 the next one opens before the last closes
+    trades = []
+    cursor = start
+    for _ in range(positions):
+        hold = rng.randint(min_hold_seconds, max_hold_seconds)
+        symbol = rng.choice(symbols)
+        if max_open > 1 and trades and rng.random() < 0.5:
+            # Hedge the previous position
+            symbol, side = trades[-1]["symbol"], 1 - trades[-1]["type"]
+        else:
+            side = rng.choice((DEAL_TYPE_BUY, DEAL_TYPE_SELL))
+        trades.append({
+            "symbol": symbol,
+            "type": side,
+            "open": int(cursor),
+            "close": int(cursor + hold),
+            "volume": round(rng.uniform(*volume), 2)
+        })
+        cursor += hold / max_open + rng.randint(0, max(max_hold_seconds // max_open, 1))
+
+    # One continuous random walk per symbol, sampled only while a position is open
+    ticks: Dict[str, List[dict]] = {}
+    for symbol in sorted({trade["symbol"] for trade in trades}):
+        price, point, digits, _, volatility, _ = SYNTHETIC_SYMBOLS[symbol]
+        spread = 10 * point
+        windows = sorted((trade["open"], trade["close"]) for trade in trades if trade["symbol"] == symbol)
+        series = []
+        last = None
+        for open_time, close_time in windows:
+            for t in range(max(open_time, last + tick_seconds if last else open_time), close_time + tick_seconds, tick_seconds):
+                step = t - last if last else tick_seconds
+                price = max(price + rng.gauss(0, volatility * math.sqrt(step)), 100 * point)
+                bid = round(price, digits)
+                series.append({
+                    "time": t, "time_msc": t * 1000, "bid": bid, "ask": round(bid + spread, digits),
+                    "last": 0.0, "volume": 0, "flags": 6
+                })
+                last = t
+        ticks[symbol] = series
+
+    tick_times = {symbol: [tick["time"] for tick in series] for symbol, series in ticks.items()}
+
+    def price_at(symbol: str, t: int) -> dict:
+        index = bisect.bisect_right(tick_times[symbol], t) - 1
+        return ticks[symbol][max(index, 0)]
+
+    deals = [TradeDeal(
+        ticket=1, time=int(start) - 3600, type=DEAL_TYPE_BALANCE, profit=initial_balance, comment="Deposit"
+    )._asdict()]
+    balance = initial_balance
+    for position_id, trade in enumerate(sorted(trades, key=lambda trade: trade["open"]), start=1000):
+        contract_size = SYNTHETIC_SYMBOLS[trade["symbol"]][3]
+        direction = 1 if trade["type"] == DEAL_TYPE_BUY else -1
+        open_tick = price_at(trade["symbol"], trade["open"])
+        close_tick = price_at(trade["symbol"], trade["close"])
+        open_price = open_tick["ask"] if direction == 1 else open_tick["bid"]
+        close_price = close_tick["bid"] if direction == 1 else close_tick["ask"]
+        profit = round((close_price - open_price) * direction * contract_size * trade["volume"], 2)
+        commission = -round(3.5 * trade["volume"], 2)
+        balance += profit + 2 * commission
+        for entry_type, t, price, deal_profit in (
+            (DEAL_ENTRY_IN, trade["open"], open_price, 0.0),
+            (DEAL_ENTRY_OUT, trade["close"], close_price, profit)
+        ):
+            deals.append(TradeDeal(
+                ticket=len(deals) + 1, order=len(deals) + 1, time=t, time_msc=t * 1000,
+                # The closing deal goes the opposite way
+                type=trade["type"] if entry_type == DEAL_ENTRY_IN else 1 - trade["type"],
+                entry=entry_type, position_id=position_id, volume=trade["volume"], price=price,
+                commission=commission, profit=deal_profit, symbol=trade["symbol"]
+            )._asdict())
+    deals.sort(key=lambda deal: deal["time_msc"])
+
+    rates = {symbol: _minute_bars(series) for symbol, series in ticks.items()}
+    return {
+        "account": AccountInfo(
+            login=int(login), balance=round(balance, 2), equity=round(balance, 2),
+            margin_free=round(balance, 2), currency="USD", server="Synthetic-Demo"
+        )._asdict(),
+        "deals": deals,
+        "symbols": {
+            symbol: SymbolInfo(
+                name=symbol, point=SYNTHETIC_SYMBOLS[symbol][1], digits=SYNTHETIC_SYMBOLS[symbol][2],
+                trade_contract_size=SYNTHETIC_SYMBOLS[symbol][3],
+                currency_base=SYNTHETIC_SYMBOLS[symbol][5], currency_profit="USD"
+            )._asdict()
+            for symbol in ticks
+        },
+        "ticks": ticks,
+        "rates": rates
+    }
+
+def _minute_bars(ticks: List[dict]) -> List[dict]:
+    bars = []
+    for tick in ticks:
+        minute = tick["time"] - tick["time"] % 60
+        if bars and bars[-1]["time"] == minute:
+            bar = bars[-1]
+            bar["high"] = max(bar["high"], tick["bid"])
+            bar["low"] = min(bar["low"], tick["bid"])
+            bar["close"] = tick["bid"]
+            bar["tick_volume"] += 1
+        else:
+            bars.append({
+                "time": minute, "open": tick["bid"], "high": tick["bid"], "low": tick["bid"],
+                "close": tick["bid"], "tick_volume": 1, "spread": 10, "real_volume": 0
+            })
+    return bars
+
+class FakeBackend:
+    """Stands in for the MetaTrader5 module; accounts come from fixtures, else from the synthetic market"""
+    TIMEFRAME_M1 = TIMEFRAME_M1
+    COPY_TICKS_ALL = COPY_TICKS_ALL
+
+    def __init__(
+        self,
+        fixture_dir: Optional[str] = None,
+        seed: int = 0,
+        latency_ms: float = 0.0,
+        generator: Callable[..., dict] = synthetic_account,
+        latency_sigma: float = 0.0,
+        login_latency_ms: float = 0.0
+    ):
+        self.fixture_dir = Path(fixture_dir) if fixture_dir else None
+        self.seed = seed
+        self.latency = latency_ms / 1000
+        self.latency_sigma = latency_sigma
+        self.login_latency = login_latency_ms / 1000
+        self.generator = generator
+        self._latency_rng = random.Random(seed)
+        self.initialized = False
+        self.calls = 0
+        self._login = None
+        self._account: Optional[dict] = None
+        self._error = (1, "Success")
+
+    def _call(self, median: Optional[float] = None):
+        """Count the call and sleep like terminal IPC would: lognormal around the median latency"""
+        self.calls += 1
+        median = self.latency if median is None else median
+        if median:
+            jitter = self._latency_rng.lognormvariate(0, self.latency_sigma) if self.latency_sigma else 1.0
+            time.sleep(median * jitter)
+
+    def _fail(self, code: int, message: str):
+        self._error = (code, message)
+        return None
+
+    def _load(self, login) -> dict:
+        if self.fixture_dir:
+            path = self.fixture_dir / f"{login}.json"
+            if path.exists():
+                logger.info(f"Fake MT5 serving account {login} from {path}")
+                return orjson.loads(path.read_bytes())
+        logger.info(f"Fake MT5 generating synthetic account {login} (seed {self.seed})")
+        return self.generator(login, seed=self.seed)
+
+    def _series(self, kind: str, symbol: str, date_from, date_to) -> Optional[List[dict]]:
+        if self._account is None:
+            return self._fail(-10004, "No IPC connection")
+        series = self._account[kind].get(symbol, [])
+        times = [row["time"] for row in series]
+        low = bisect.bisect_left(times, _timestamp(date_from))
+        high = bisect.bisect_right(times, _timestamp(date_to))
+        return series[low:high]
+
+    def initialize(self, path: Optional[str] = None, **kwargs) -> bool:
+        self._call()
+        self.initialized = True
+        self._error = (1, "Success")
+        return True
+
+    def login(self, login, password: Optional[str] = None, server: Optional[str] = None, **kwargs) -> bool:
+        self._call(self.login_latency or None)
+        if not self.initialized:
+            self._fail(-10004, "No IPC connection")
+            return False
+        if login != self._login:
+            self._account = self._load(login)
+            self._login = login
+        return True
+
+    def shutdown(self):
+        self._call()
+        self.initialized = False
+
+    def last_error(self) -> tuple:
+        return self._error
+
+    def account_info(self) -> Optional[AccountInfo]:
+        self._call()
+        if not self.initialized or self._account is None:
+            return self._fail(-10004, "No IPC connection")
+        return _record(AccountInfo, self._account["account"])
+
+    def history_deals_get(self, date_from, date_to) -> Optional[tuple]:
+        self._call()
+        if not self.initialized or self._account is None:
+            return self._fail(-10004, "No IPC connection")
+        low, high = _timestamp(date_from), _timestamp(date_to)
+        return tuple(_record(TradeDeal, deal) for deal in self._account["deals"] if low <= deal["time"] <= high)
+
+    def history_orders_total(self, date_from, date_to) -> int:
+        self._call()
+        if not self.initialized or self._account is None:
+            return self._fail(-10004, "No IPC connection")
+        low, high = _timestamp(date_from), _timestamp(date_to)
+        return sum(1 for deal in self._account["deals"] if low <= deal["time"] <= high)
+
+    def symbol_info(self, symbol: str) -> Optional[SymbolInfo]:
+        self._call()
+        if self._account is None or symbol not in self._account["symbols"]:
+            return self._fail(-1, f"Unknown symbol {symbol}")
+        return _record(SymbolInfo, self._account["symbols"][symbol])
+
+    def copy_ticks_range(self, symbol: str, date_from, date_to, flags: int = COPY_TICKS_ALL) -> Optional[List[dict]]:
+        self._call()
+        return self._series("ticks", symbol, date_from, date_to)
+
+    def copy_rates_range(self, symbol: str, timeframe: int, date_from, date_to) -> Optional[List[dict]]:
+        self._call()
+        if timeframe != TIMEFRAME_M1:
+            return self._fail(-2, "Fake MT5 only serves M1 bars")
+        return self._series("rates", symbol, date_from, date_to)
+
+class RecordingBackend:
+    """Passes every call to a live backend and saves the logged-in account's data as a fixture on shutdown"""
+
+    def __init__(self, live, fixture_dir: str):
+        self.live = live
+        self.fixture_dir = Path(fixture_dir)
+        self._login = None
+        self._fixture: Optional[dict] = None
+
+    def __getattr__(self, name):
+        # Constants and calls that don't return account data
+        return getattr(self.live, name)
+
+    def login(self, login, *args, **kwargs) -> bool:
+        ok = self.live.login(login, *args, **kwargs)
+        if ok and login != self._login:
+            self.save()
+            self._login = login
+            self._fixture = {"account": {}, "deals": [], "symbols": {}, "ticks": {}, "rates": {}}
+        return ok
+
+    def account_info(self):
+        info = self.live.account_info()
+        if info is not None and self._fixture is not None:
+            self._fixture["account"] = _as_dict(info)
+        return info
+
+    def history_deals_get(self, *args, **kwargs):
+        deals = self.live.history_deals_get(*args, **kwargs)
+        if deals and self._fixture is not None:
+            self._fixture["deals"] = _merge(self._fixture["deals"], deals, "ticket")
+        return deals
+
+    def symbol_info(self, symbol: str):
+        info = self.live.symbol_info(symbol)
+        if info is not None and self._fixture is not None:
+            self._fixture["symbols"][symbol] = {
+                key: value for key, value in _as_dict(info).items() if key in SymbolInfo._fields
+            }
+        return info
+
+    def copy_ticks_range(self, symbol: str, *args, **kwargs):
+        ticks = self.live.copy_ticks_range(symbol, *args, **kwargs)
+        if ticks is not None and len(ticks) and self._fixture is not None:
+            self._fixture["ticks"][symbol] = _merge(self._fixture["ticks"].get(symbol, []), ticks, "time_msc")
+        return ticks
+
+    def copy_rates_range(self, symbol: str, timeframe: int, *args, **kwargs):
+        rates = self.live.copy_rates_range(symbol, timeframe, *args, **kwargs)
+        if rates is not None and len(rates) and self._fixture is not None and timeframe == TIMEFRAME_M1:
+            self._fixture["rates"][symbol] = _merge(self._fixture["rates"].get(symbol, []), rates, "time")
+        return rates
+
+    def shutdown(self):
+        self.save()
+        self._login = None
+        self._fixture = None
+        return self.live.shutdown()
+
+    def save(self) -> Optional[Path]:
+        """Write the current session's fixture, if there is one"""
+        if self._fixture is None:
+            return None
+        self.fixture_dir.mkdir(parents=True, exist_ok=True)
+        path = self.fixture_dir / f"{self._login}.json"
+        path.write_bytes(orjson.dumps(self._fixture))
+        logger.info(f"Recorded MT5 session for {self._login} to {path}")
+        return path
+
+def _merge(existing: List[dict], records, key: str) -> List[dict]:
+    """Union of recorded rows and new MetaTrader5 records, ordered and de-duplicated by key"""
+    rows = {row[key]: row for row in existing}
+    for record in records:
+        row = _as_dict(record)
+        rows[row[key]] = row
+    return [rows[k] for k in sorted(rows)]
+
+def create_backend(kind: str):
+    """Backend for MT5_BACKEND: "metatrader5", "fake" or "record" """
+    if kind == "fake":
+        return FakeBackend(
+            settings.mt5_fixture_dir,
+            settings.mt5_fake_seed,
+            settings.mt5_fake_latency_ms,
+            generator=partial(synthetic_account, positions=settings.mt5_fake_positions),
+            latency_sigma=settings.mt5_fake_latency_sigma,
+            login_latency_ms=settings.mt5_fake_login_latency_ms
+        )
+    if kind not in ("metatrader5", "record"):
+        raise ValueError(f"Unknown MT5 backend: {kind}")
+    live = importlib.import_module("MetaTrader5")
+    return RecordingBackend(live, settings.mt5_fixture_dir) if kind == "record" else live
+
+_backend = None
+
+def get_backend():
+    """This process's backend; MetaTrader5 holds one terminal connection per process, so there is one"""
+    global _backend
+    if _backend is None:
+        _backend = create_backend(settings.mt5_backend)
+    return _backend
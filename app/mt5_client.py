@@ -1,20 +1,21 @@
-import MetaTrader5 as mt5
 from datetime import datetime
 from typing import Optional, List, Dict, Any
+from app.mt5_backend import get_backend, COPY_TICKS_ALL
 import logging
 
 logger = logging.getLogger(__name__)
 
 class MT5Client:
-    def __init__(self, mt5_path: str, timeout: int = 30):
+    def __init__(self, mt5_path: str, timeout: int = 30, backend=None):
         self.mt5_path = mt5_path
         self.timeout = timeout
         self.connected = False
+        self.mt5 = backend or get_backend()
         
     def initialize(self) -> bool:
         """Initialize MT5 terminal"""
-        if not mt5.initialize(self.mt5_path, timeout=self.timeout):
-            logger.error(f"MT5 initialize failed: {mt5.last_error()}")
+        if not self.mt5.initialize(self.mt5_path, timeout=self.timeout):
+            logger.error(f"MT5 initialize failed: {self.mt5.last_error()}")
             return False
         self.connected = True
         logger.info("MT5 initialized successfully")
@@ -27,8 +28,8 @@ class MT5Client:
                 return False
         
         login_int = int(login)
-        if not mt5.login(login_int, password=password, server=server):
-            logger.error(f"MT5 login failed for {login}: {mt5.last_error()}")
+        if not self.mt5.login(login_int, password=password, server=server):
+            logger.error(f"MT5 login failed for {login}: {self.mt5.last_error()}")
             return False
         
         logger.info(f"MT5 logged in successfully: {login}")
@@ -36,9 +37,9 @@ class MT5Client:
     
     def get_account_info(self) -> Optional[Dict[str, Any]]:
         """Get account information"""
-        account_info = mt5.account_info()
+        account_info = self.mt5.account_info()
         if account_info is None:
-            logger.error(f"Failed to get account info: {mt5.last_error()}")
+            logger.error(f"Failed to get account info: {self.mt5.last_error()}")
             return None
         
         info = {
@@ -61,19 +62,19 @@ class MT5Client:
         to_date = datetime.now()
         
         # Try to get all deals without date filter first
-        deals = mt5.history_deals_get(0, to_date)
+        deals = self.mt5.history_deals_get(0, to_date)
         
         if deals is None or len(deals) == 0:
             # Fallback to date range
-            deals = mt5.history_deals_get(from_date, to_date)
+            deals = self.mt5.history_deals_get(from_date, to_date)
         
         if deals is None:
-            error = mt5.last_error()
+            error = self.mt5.last_error()
             logger.error(f"Failed to get deals: {error}")
             logger.info("Trying alternative method: history_orders_total()")
             
             # Check if there are any orders at all
-            orders_total = mt5.history_orders_total(from_date, to_date)
+            orders_total = self.mt5.history_orders_total(from_date, to_date)
             logger.info(f"Total orders in history: {orders_total}")
             
             return []
@@ -137,7 +138,7 @@ class MT5Client:
     
     def get_ticks(self, symbol: str, from_date: datetime, to_date: datetime) -> Optional[Any]:
         """Get historical tick data for a symbol"""
-        ticks = mt5.copy_ticks_range(symbol, from_date, to_date, mt5.COPY_TICKS_ALL)
+        ticks = self.mt5.copy_ticks_range(symbol, from_date, to_date, COPY_TICKS_ALL)
         
         if ticks is None or len(ticks) == 0:
             logger.warning(f"No ticks found for {symbol} from {from_date} to {to_date}")
@@ -148,7 +149,7 @@ class MT5Client:
     
     def get_rates(self, symbol: str, timeframe: int, from_date: datetime, to_date: datetime) -> Optional[Any]:
         """Get historical rates (bars) for a symbol"""
-        rates = mt5.copy_rates_range(symbol, timeframe, from_date, to_date)
+        rates = self.mt5.copy_rates_range(symbol, timeframe, from_date, to_date)
         
         if rates is None or len(rates) == 0:
             logger.warning(f"No rates found for {symbol} from {from_date} to {to_date}")
@@ -158,10 +159,10 @@ class MT5Client:
     
     def get_symbol_info(self, symbol: str) -> Optional[Dict[str, Any]]:
         """Get symbol information"""
-        symbol_info = mt5.symbol_info(symbol)
+        symbol_info = self.mt5.symbol_info(symbol)
         
         if symbol_info is None:
-            logger.error(f"Failed to get symbol info for {symbol}: {mt5.last_error()}")
+            logger.error(f"Failed to get symbol info for {symbol}: {self.mt5.last_error()}")
             return None
         
         return {
@@ -175,6 +176,6 @@ class MT5Client:
     def shutdown(self):
         """Shutdown MT5 connection"""
         if self.connected:
-            mt5.shutdown()
+            self.mt5.shutdown()
             self.connected = False
             logger.info("MT5 shutdown")
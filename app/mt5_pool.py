@@ -1,8 +1,8 @@
 import asyncio
-import MetaTrader5 as mt5
 from typing import Optional, List
 from dataclasses import dataclass
 from config import settings
+from app.mt5_backend import get_backend
 import logging
 import subprocess
 import time
@@ -26,21 +26,22 @@ class MT5Pool:
     def __init__(self):
         self.terminals: List[MT5Terminal] = []
         self.lock = None  # Will be created when needed
+        self.mt5 = get_backend()
         self._initialize_pool()
     
     def _initialize_pool(self):
         """Initialize pool with available MT5 paths"""
-        paths = [settings.mt5_path]
-        if settings.mt5_path_2:
-            paths.append(settings.mt5_path_2)
-        if settings.mt5_path_3:
-            paths.append(settings.mt5_path_3)
+        paths = settings.mt5_terminal_paths()
         
         logger.info("="*60)
         logger.info("MT5 TERMINAL POOL INITIALIZATION")
         logger.info("="*60)
         
         for i, path in enumerate(paths):
+            # A pinned worker only ever touches its own terminal
+            if settings.mt5_terminal_id is not None and i != settings.mt5_terminal_id:
+                continue
+            
             terminal = MT5Terminal(id=i, path=path)
             self.terminals.append(terminal)
             
@@ -51,6 +52,9 @@ class MT5Pool:
             else:
                 logger.warning(f"⚠️  Terminal {i}: {path} (NOT FOUND)")
         
+        if not self.terminals:
+            logger.error(f"No terminal configured for MT5_TERMINAL_ID={settings.mt5_terminal_id}")
+        
         logger.info("="*60)
         logger.info(f"Pool Size: {len(self.terminals)} terminal(s) configured")
         logger.info("="*60)
@@ -86,7 +90,7 @@ class MT5Pool:
             terminal.busy = False
             if terminal.connected:
                 try:
-                    mt5.shutdown()
+                    self.mt5.shutdown()
                     terminal.connected = False
                     logger.info(f"Terminal {terminal.id} disconnected")
                 except Exception as e:
@@ -99,8 +103,8 @@ class MT5Pool:
             logger.info(f"Connecting terminal {terminal.id} to {login}@{server}")
             
             # Initialize MT5 with specific path
-            if not mt5.initialize(terminal.path, timeout=settings.mt5_timeout):
-                error = mt5.last_error()
+            if not self.mt5.initialize(terminal.path, timeout=settings.mt5_timeout):
+                error = self.mt5.last_error()
                 logger.error(f"Terminal {terminal.id} initialize failed: {error}")
                 logger.error(f"Path: {terminal.path}")
                 logger.error("Make sure MT5 is installed and logged into any account")
@@ -109,11 +113,11 @@ class MT5Pool:
             logger.info(f"Terminal {terminal.id} initialized")
             
             # Login to specific account
-            if not mt5.login(int(login), password, server):
-                error = mt5.last_error()
+            if not self.mt5.login(int(login), password, server):
+                error = self.mt5.last_error()
                 logger.error(f"Terminal {terminal.id} login failed: {error}")
                 logger.error(f"Credentials: {login}@{server}")
-                mt5.shutdown()
+                self.mt5.shutdown()
                 return False
             
             logger.info(f"Terminal {terminal.id} logged in: {login}@{server}")
@@ -124,5 +128,11 @@ class MT5Pool:
             logger.error(f"Terminal {terminal.id} connection error: {e}")
             return False
 
-# Global pool instance
-mt5_pool = MT5Pool()
\ No newline at end of file
+_pool: Optional[MT5Pool] = None
+
+def get_mt5_pool() -> MT5Pool:
+    """This worker's terminal pool, built on first use (never in the API process)"""
+    global _pool
+    if _pool is None:
+        _pool = MT5Pool()
+    return _pool
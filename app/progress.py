@@ -0,0 +1,112 @@
+"""Job progress events over Redis pub/sub.
+
+Workers publish each stage of a check to a per-job and a per-tenant channel
+and keep the latest event per job, so late subscribers start from the
+current state. The API streams these as Server-Sent Events.
+"""
+import json
+import time
+import hashlib
+import logging
+from typing import Optional, Dict, Any, Callable, AsyncIterator, List
+from app.redis_client import get_redis, get_async_redis
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "brymix:progress"
+TERMINAL_STAGES = ("completed", "failed")
+LAST_EVENT_TTL_SECONDS = 3600
+KEEPALIVE_SECONDS = 15
+
+def job_channel(job_id: str) -> str:
+    return f"{KEY_PREFIX}:job:{job_id}"
+
+def tenant_channel(tenant: Optional[str]) -> str:
+    tenant_hash = hashlib.sha256((tenant or "default").encode()).hexdigest()[:16]
+    return f"{KEY_PREFIX}:tenant:{tenant_hash}"
+
+class ProgressPublisher:
+    @staticmethod
+    def publish(job_id: str, tenant: Optional[str], stage: str, **data):
+        """Publish a stage event; never lets a Redis problem fail the job"""
+        event = {"job_id": job_id, "stage": stage, "timestamp": time.time(), **data}
+        payload = json.dumps(event, default=str)
+        try:
+            # One transaction so a subscriber that reads the last event after subscribing can't miss one
+            pipe = get_redis().pipeline(transaction=True)
+            pipe.set(f"{KEY_PREFIX}:last:{job_id}", payload, ex=LAST_EVENT_TTL_SECONDS)
+            pipe.publish(job_channel(job_id), payload)
+            pipe.publish(tenant_channel(tenant), payload)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to publish progress for job {job_id}: {e}")
+
+    @staticmethod
+    def reporter(job_id: str, tenant: Optional[str]) -> Callable[..., None]:
+        """Callback bound to one job, handed to the rule checkers"""
+        def report(stage: str, **data):
+            ProgressPublisher.publish(job_id, tenant, stage, **data)
+        return report
+
+async def last_event(job_id: str) -> Optional[Dict[str, Any]]:
+    payload = await get_async_redis().get(f"{KEY_PREFIX}:last:{job_id}")
+    return json.loads(payload) if payload else None
+
+async def subscribe(channel: str):
+    """Subscribe before reading current state so no event falls in between"""
+    pubsub = get_async_redis().pubsub()
+    await pubsub.subscribe(channel)
+    return pubsub
+
+def format_sse(event: Dict[str, Any]) -> str:
+    return f"event: {event['stage']}\ndata: {json.dumps(event)}\n\n"
+
+async def stream_events(pubsub, initial: List[Dict[str, Any]], close_on_terminal: bool) -> AsyncIterator[str]:
+    """Yield SSE frames from a subscription, with keep-alive comments while idle"""
+    try:
+        for event in initial:
+            yield format_sse(event)
+            if close_on_terminal and event["stage"] in TERMINAL_STAGES:
+                return
+
+        last_sent = time.monotonic()
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            if message:
+                event = json.loads(message["data"])
+                yield format_sse(event)
+                last_sent = time.monotonic()
+                if close_on_terminal and event["stage"] in TERMINAL_STAGES:
+                    return
+            elif time.monotonic() - last_sent > KEEPALIVE_SECONDS:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
+
+async def wait_for_terminal(job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+    """Long-poll helper: wait until the job completes or fails, or the timeout passes"""
+    pubsub = await subscribe(job_channel(job_id))
+    try:
+        event = await last_event(job_id)
+        if event and event["stage"] in TERMINAL_STAGES:
+            return event
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            message = await pubsub.get_message(
+                ignore_subscribe_messages=True,
+                timeout=min(1.0, max(0.0, deadline - time.monotonic()))
+            )
+            if message:
+                event = json.loads(message["data"])
+                if event["stage"] in TERMINAL_STAGES:
+                    return event
+        return None
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
+
+# Global publisher instance
+progress_publisher = ProgressPublisher()
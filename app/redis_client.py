@@ -0,0 +1,20 @@
+import redis
+import redis.asyncio as aioredis
+from config import settings
+
+_client: redis.Redis = None
+_async_client: aioredis.Redis = None
+
+def get_redis() -> redis.Redis:
+    """Get the shared Redis client (created on first use)"""
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.redis_url)
+    return _client
+
+def get_async_redis() -> aioredis.Redis:
+    """Get the shared asyncio Redis client for API handlers"""
+    global _async_client
+    if _async_client is None:
+        _async_client = aioredis.Redis.from_url(settings.redis_url)
+    return _async_client
@@ -0,0 +1,201 @@
+"""Async data access for the API request handlers"""
+import base64
+from datetime import datetime
+from typing import Optional, List, Tuple, Dict, AsyncIterator
+from sqlalchemy import select, func, or_, and_, exists
+from sqlalchemy.orm import joinedload, defer
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import Job, JobMetrics, JobViolation, JobArchive, ApiKey
+
+class ApiKeyRepository:
+    @staticmethod
+    async def get_active(db: AsyncSession, key: str) -> Optional[ApiKey]:
+        result = await db.execute(
+            select(ApiKey).where(ApiKey.key == key, ApiKey.active == True)
+        )
+        return result.scalars().first()
+
+    @staticmethod
+    async def get_active_for_owner(db: AsyncSession, key: str, owner_email: str) -> Optional[ApiKey]:
+        result = await db.execute(
+            select(ApiKey).where(
+                ApiKey.key == key,
+                ApiKey.owner_email == owner_email,
+                ApiKey.active == True
+            )
+        )
+        return result.scalars().first()
+
+    @staticmethod
+    async def list_active_for_owner(db: AsyncSession, owner_email: str) -> List[ApiKey]:
+        result = await db.execute(
+            select(ApiKey).where(ApiKey.owner_email == owner_email, ApiKey.active == True)
+        )
+        return result.scalars().all()
+
+    @staticmethod
+    async def add(db: AsyncSession, api_key: ApiKey) -> ApiKey:
+        db.add(api_key)
+        await db.commit()
+        return api_key
+
+class JobRepository:
+    @staticmethod
+    async def get_for_owner(db: AsyncSession, job_id: str, owner_email: Optional[str]) -> Optional[Job]:
+        result = await db.execute(
+            select(Job).where(Job.id == job_id, Job.api_key_owner == owner_email)
+        )
+        return result.scalars().first()
+
+    @staticmethod
+    async def get_state_for_owner(db: AsyncSession, job_id: str, owner_email: Optional[str]):
+        """Status columns only; the result blob is fetched separately when it is really needed"""
+        result = await db.execute(
+            select(Job.id, Job.status, Job.created_at, Job.completed_at, Job.error_message, Job.result_version)
+            .where(Job.id == job_id, Job.api_key_owner == owner_email)
+        )
+        return result.first()
+
+    @staticmethod
+    async def get_result(db: AsyncSession, job_id: str) -> Optional[str]:
+        result = await db.execute(select(Job.result).where(Job.id == job_id))
+        return result.scalar()
+
+    @staticmethod
+    async def get_archive_location(db: AsyncSession, job_id: str) -> Optional[Tuple[str, int, int, int]]:
+        """(path, frame_offset, frame_length, line) of an archived result"""
+        result = await db.execute(
+            select(JobArchive.path, JobArchive.frame_offset, JobArchive.frame_length, JobArchive.line)
+            .where(JobArchive.job_id == job_id)
+        )
+        row = result.first()
+        return tuple(row) if row else None
+
+    @staticmethod
+    async def list_for_owner(
+        db: AsyncSession,
+        owner_email: Optional[str],
+        limit: int,
+        cursor: Optional[Tuple[datetime, str]] = None,
+        status: Optional[str] = None,
+        challenge_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+        challenge_status: Optional[str] = None,
+        violation_type: Optional[str] = None,
+        min_drawdown_percent: Optional[float] = None
+    ) -> Tuple[List[Job], Optional[Tuple[datetime, str]]]:
+        """Newest-first page of a tenant's jobs with their metrics, returns (jobs, cursor for the next page)"""
+        # Listings never show results, so don't read the blobs
+        query = (
+            select(Job)
+            .options(joinedload(Job.metrics), defer(Job.result), defer(Job.error_message))
+            .where(Job.api_key_owner == owner_email)
+        )
+        
+        if status:
+            query = query.where(Job.status == status)
+        if challenge_id:
+            query = query.where(Job.challenge_id == challenge_id)
+        if user_id:
+            query = query.where(Job.user_id == user_id)
+        if created_from:
+            query = query.where(Job.created_at >= created_from)
+        if created_to:
+            query = query.where(Job.created_at < created_to)
+        
+        # Result filters run against the metrics side table, never the JSON blob
+        if challenge_status or min_drawdown_percent is not None:
+            query = query.join(JobMetrics, JobMetrics.job_id == Job.id)
+        if challenge_status:
+            query = query.where(JobMetrics.challenge_status == challenge_status)
+        if min_drawdown_percent is not None:
+            query = query.where(JobMetrics.max_drawdown_percent >= min_drawdown_percent)
+        if violation_type:
+            query = query.where(exists().where(
+                JobViolation.job_id == Job.id,
+                JobViolation.api_key_owner == owner_email,
+                JobViolation.rule == violation_type
+            ))
+        
+        # Keyset: continue strictly after the last row of the previous page
+        if cursor:
+            cursor_created_at, cursor_id = cursor
+            query = query.where(or_(
+                Job.created_at < cursor_created_at,
+                and_(Job.created_at == cursor_created_at, Job.id < cursor_id)
+            ))
+        
+        result = await db.execute(
+            query.order_by(Job.created_at.desc(), Job.id.desc()).limit(limit + 1)
+        )
+        jobs = result.scalars().all()
+        
+        if len(jobs) > limit:
+            jobs = jobs[:limit]
+            return jobs, (jobs[-1].created_at, jobs[-1].id)
+        return jobs, None
+
+    @staticmethod
+    async def count_by_status(db: AsyncSession, owner_email: Optional[str], statuses: List[str]) -> Dict[str, int]:
+        """Current job counts per status for a tenant, served from the (owner, status) index"""
+        result = await db.execute(
+            select(Job.status, func.count())
+            .where(Job.api_key_owner == owner_email, Job.status.in_(statuses))
+            .group_by(Job.status)
+        )
+        return {status: count for status, count in result.all()}
+
+    @staticmethod
+    async def stream_for_owner(
+        db: AsyncSession,
+        owner_email: Optional[str],
+        batch_size: int,
+        status: Optional[str] = None,
+        challenge_status: Optional[str] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None
+    ) -> AsyncIterator[list]:
+        """Oldest-first batches of a tenant's jobs with results and metrics, read through a server-side cursor"""
+        query = (
+            select(
+                Job.id, Job.user_id, Job.challenge_id, Job.status, Job.created_at, Job.completed_at,
+                Job.error_message, Job.result, JobMetrics.challenge_status, JobMetrics.max_drawdown_percent,
+                JobMetrics.profit_percent, JobMetrics.total_trades, JobMetrics.currency, JobMetrics.violation_count,
+                JobArchive.path, JobArchive.frame_offset, JobArchive.frame_length, JobArchive.line
+            )
+            .outerjoin(JobMetrics, JobMetrics.job_id == Job.id)
+            .outerjoin(JobArchive, JobArchive.job_id == Job.id)
+            .where(Job.api_key_owner == owner_email)
+        )
+        if status:
+            query = query.where(Job.status == status)
+        if challenge_status:
+            query = query.where(JobMetrics.challenge_status == challenge_status)
+        if created_from:
+            query = query.where(Job.created_at >= created_from)
+        if created_to:
+            query = query.where(Job.created_at < created_to)
+        
+        result = await db.stream(
+            query.order_by(Job.created_at, Job.id).execution_options(yield_per=batch_size)
+        )
+        async for batch in result.partitions():
+            yield batch
+
+    @staticmethod
+    async def add(db: AsyncSession, job: Job) -> Job:
+        db.add(job)
+        await db.commit()
+        return job
+
+def encode_cursor(cursor: Tuple[datetime, str]) -> str:
+    created_at, job_id = cursor
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{job_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(token: str) -> Tuple[datetime, str]:
+    """Raises ValueError for a malformed cursor"""
+    padded = token + "=" * (-len(token) % 4)
+    created_at, job_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|", 1)
+    return datetime.fromisoformat(created_at), job_id
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional, Callable
 from datetime import datetime
 from app.models import CheckRequest, CheckResponse, Metrics, Violation, ChallengeStatus
 from app.mt5_client import MT5Client
@@ -9,10 +9,11 @@ import logging
 logger = logging.getLogger(__name__)
 
 class RuleChecker:
-    def __init__(self, mt5_client: MT5Client):
+    def __init__(self, mt5_client: MT5Client, progress: Optional[Callable[..., None]] = None):
         self.mt5_client = mt5_client
+        self.progress = progress or (lambda stage, **data: None)
         self.duration_checker = DurationChecker()
-        self.drawdown_checker = DrawdownChecker(mt5_client)
+        self.drawdown_checker = DrawdownChecker(mt5_client, self.progress)
     
     def check_challenge(self, request: CheckRequest, job_id: str) -> CheckResponse:
         """
@@ -23,6 +24,7 @@ class RuleChecker:
         # Login to MT5
         if not self.mt5_client.login(request.mt5_login, request.mt5_password, request.mt5_server):
             raise Exception("Failed to login to MT5")
+        self.progress("login", mt5_login=request.mt5_login)
         
         try:
             # Get account data
@@ -35,6 +37,7 @@ class RuleChecker:
             positions = self.mt5_client.get_positions_history()
             
             logger.info(f"Retrieved {len(positions)} positions and {len(deals)} deals")
+            self.progress("deals_fetched", deals=len(deals), positions=len(positions))
             
             # Run all checks
             all_violations = []
@@ -107,6 +110,7 @@ class RuleChecker:
             )
             
             logger.info(f"Challenge check complete: {status}, {len(all_violations)} violations")
+            self.progress("verdict", status=status.value, violations=len(all_violations))
             return response
             
         finally:
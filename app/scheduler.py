@@ -0,0 +1,214 @@
+"""Per-tenant weighted fair scheduling of challenge checks.
+
+`create_check` pushes the job into a per-tenant Redis queue and sends a
+dispatch token; the worker that takes the token asks the scheduler which
+job to run next (deficit round-robin over tenants).
+"""
+import time
+import logging
+from dataclasses import dataclass
+from typing import Optional, Dict, Any
+from app.models import CheckPriority
+from app.redis_client import get_redis
+from app.serialization import pack, unpack
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "brymix:sched"
+DEFAULT_TENANT = "default"
+
+# Append a job to a tenant queue and put the tenant on the ring if it isn't there yet
+_ENQUEUE_SCRIPT = """
+redis.call('RPUSH', KEYS[1], ARGV[2])
+redis.call('HSET', KEYS[4], ARGV[1], ARGV[3])
+if redis.call('SADD', KEYS[2], ARGV[1]) == 1 then
+    redis.call('RPUSH', KEYS[3], ARGV[1])
+end
+return redis.call('LLEN', KEYS[1])
+"""
+
+# Deficit round-robin pop: the tenant at the head of the ring is served until
+# its credit (weight) runs out, then it rotates to the tail. Tenants whose
+# queue is empty leave the ring and lose their remaining credit.
+_POP_SCRIPT = """
+local ring, members, deficit, weights = KEYS[1], KEYS[2], KEYS[3], KEYS[4]
+local n = redis.call('LLEN', ring)
+for _ = 1, n do
+    local tenant = redis.call('LINDEX', ring, 0)
+    local queue = ARGV[1] .. tenant
+    local item = redis.call('LPOP', queue)
+    if not item then
+        redis.call('LPOP', ring)
+        redis.call('SREM', members, tenant)
+        redis.call('HDEL', deficit, tenant)
+    else
+        local credit = tonumber(redis.call('HGET', deficit, tenant) or '0')
+        if credit < 1 then
+            credit = credit + tonumber(redis.call('HGET', weights, tenant) or ARGV[2])
+        end
+        credit = credit - 1
+        if redis.call('LLEN', queue) == 0 then
+            redis.call('LPOP', ring)
+            redis.call('SREM', members, tenant)
+            redis.call('HDEL', deficit, tenant)
+        else
+            if credit < 1 then
+                redis.call('RPUSH', ring, redis.call('LPOP', ring))
+            end
+            redis.call('HSET', deficit, tenant, credit)
+        end
+        return {tenant, item}
+    end
+end
+return false
+"""
+
+@dataclass
+class ScheduledCheck:
+    tenant: str
+    priority: CheckPriority
+    job_id: str
+    job_data: Dict[str, Any]
+    enqueued_at: float
+
+class FairScheduler:
+    """Weighted fair queueing of checks across api_key_owner tenants.
+
+    Interactive checks are served before bulk ones, except every
+    `scheduler_bulk_every`-th dispatch which tries bulk first.
+    """
+    def __init__(self):
+        self._enqueue = None
+        self._pop = None
+
+    def _scripts(self):
+        if self._enqueue is None:
+            redis_client = get_redis()
+            self._enqueue = redis_client.register_script(_ENQUEUE_SCRIPT)
+            self._pop = redis_client.register_script(_POP_SCRIPT)
+        return self._enqueue, self._pop
+
+    @staticmethod
+    def _key(priority: CheckPriority, name: str) -> str:
+        return f"{KEY_PREFIX}:{priority.value}:{name}"
+
+    @staticmethod
+    def _queue_key(priority: CheckPriority, tenant: str) -> str:
+        return f"{KEY_PREFIX}:{priority.value}:q:{tenant}"
+
+    @staticmethod
+    def weight_for(tenant: str) -> int:
+        """Scheduling weight for a tenant (higher gets more terminal share)"""
+        weight = settings.scheduler_tenant_weights.get(tenant, settings.scheduler_default_weight)
+        return max(1, int(weight))
+
+    def enqueue(self, tenant: Optional[str], priority: CheckPriority, job_id: str, job_data: Dict[str, Any]) -> int:
+        """Queue a job for a tenant, returns the tenant's queue depth for that priority"""
+        tenant = tenant or DEFAULT_TENANT
+        enqueue, _ = self._scripts()
+        item = pack({"job_id": job_id, "job_data": job_data, "enqueued_at": time.time()})
+        depth = enqueue(
+            keys=[
+                self._queue_key(priority, tenant),
+                self._key(priority, "members"),
+                self._key(priority, "ring"),
+                f"{KEY_PREFIX}:weights",
+            ],
+            args=[tenant, item, self.weight_for(tenant)]
+        )
+        logger.info(f"Scheduled job {job_id} for tenant {tenant} ({priority.value}, depth {depth})")
+        return depth
+
+    def pop(self) -> Optional[ScheduledCheck]:
+        """Take the next job according to priority class and tenant fairness"""
+        _, pop = self._scripts()
+        redis_client = get_redis()
+
+        tick = redis_client.incr(f"{KEY_PREFIX}:tick")
+        order = [CheckPriority.INTERACTIVE, CheckPriority.BULK]
+        if settings.scheduler_bulk_every > 0 and tick % settings.scheduler_bulk_every == 0:
+            order.reverse()
+
+        for priority in order:
+            picked = pop(
+                keys=[
+                    self._key(priority, "ring"),
+                    self._key(priority, "members"),
+                    self._key(priority, "deficit"),
+                    f"{KEY_PREFIX}:weights",
+                ],
+                args=[f"{KEY_PREFIX}:{priority.value}:q:", settings.scheduler_default_weight]
+            )
+            if not picked:
+                continue
+
+            tenant = picked[0].decode()
+            item = unpack(picked[1])
+            scheduled = ScheduledCheck(
+                tenant=tenant,
+                priority=priority,
+                job_id=item["job_id"],
+                job_data=item["job_data"],
+                enqueued_at=item["enqueued_at"]
+            )
+            self._record_wait(tenant, time.time() - scheduled.enqueued_at)
+            return scheduled
+
+        return None
+
+    def _record_wait(self, tenant: str, wait_seconds: float):
+        stats_key = f"{KEY_PREFIX}:stats:{tenant}"
+        pipe = get_redis().pipeline()
+        pipe.hincrby(stats_key, "dispatched", 1)
+        pipe.hincrbyfloat(stats_key, "wait_total", wait_seconds)
+        pipe.hset(stats_key, "last_wait", wait_seconds)
+        pipe.execute()
+
+    def depth(self) -> int:
+        """Jobs waiting in all tenant queues"""
+        redis_client = get_redis()
+        pipe = redis_client.pipeline(transaction=False)
+        for priority in CheckPriority:
+            pipe.smembers(self._key(priority, "members"))
+        members = pipe.execute()
+
+        pipe = redis_client.pipeline(transaction=False)
+        for priority, tenants in zip(CheckPriority, members):
+            for tenant in tenants:
+                pipe.llen(self._queue_key(priority, tenant.decode()))
+        return sum(pipe.execute())
+
+    def tenant_stats(self, tenant: Optional[str]) -> Dict[str, Any]:
+        """Queue depth and wait times for one tenant"""
+        tenant = tenant or DEFAULT_TENANT
+        redis_client = get_redis()
+        now = time.time()
+
+        queues = {}
+        for priority in CheckPriority:
+            queue_key = self._queue_key(priority, tenant)
+            pipe = redis_client.pipeline()
+            pipe.llen(queue_key)
+            pipe.lindex(queue_key, 0)
+            depth, oldest = pipe.execute()
+            queues[priority.value] = {
+                "depth": depth,
+                "oldest_wait_seconds": round(now - unpack(oldest)["enqueued_at"], 3) if oldest else 0.0
+            }
+
+        stats = redis_client.hgetall(f"{KEY_PREFIX}:stats:{tenant}")
+        dispatched = int(stats.get(b"dispatched", 0))
+        wait_total = float(stats.get(b"wait_total", 0))
+
+        return {
+            "tenant": tenant,
+            "weight": self.weight_for(tenant),
+            "queues": queues,
+            "dispatched": dispatched,
+            "avg_wait_seconds": round(wait_total / dispatched, 3) if dispatched else 0.0,
+            "last_wait_seconds": round(float(stats.get(b"last_wait", 0)), 3)
+        }
+
+# Global scheduler instance
+fair_scheduler = FairScheduler()
@@ -2,11 +2,14 @@
 import time
 import hashlib
 from collections import defaultdict, deque
-from fastapi import HTTPException, Request
 from cryptography.fernet import Fernet
 import secrets
 import base64
+import logging
+from dataclasses import dataclass
 from threading import Lock
+from typing import Tuple, Dict, Optional
+from app.redis_client import get_async_redis
 
 # Efficient rate limiting with cleanup
 class RateLimiter:
@@ -17,6 +20,10 @@ class RateLimiter:
         self._cleanup_interval = cleanup_interval
     
     def check_limit(self, key: str, limit: int, window: int = 60) -> bool:
+        return self.hit(key, limit, window)[0]
+    
+    def hit(self, key: str, limit: int, window: int = 60, cost: int = 1) -> Tuple[bool, int]:
+        """Count a request worth `cost` requests, returns (allowed, remaining)"""
         now = time.time()
         
         with self._lock:
@@ -31,12 +38,12 @@ class RateLimiter:
                 self._limits[key].popleft()
             
             # Check limit
-            if len(self._limits[key]) >= limit:
-                return False
+            if len(self._limits[key]) + cost > limit:
+                return False, max(0, limit - len(self._limits[key]))
             
             # Add current request
-            self._limits[key].append(now)
-            return True
+            self._limits[key].extend([now] * cost)
+            return True, limit - len(self._limits[key])
     
     def _cleanup_old_entries(self, now: float):
         """Remove old entries and empty keys"""
@@ -54,6 +61,101 @@ class RateLimiter:
 
 rate_limiter = RateLimiter()
 
+logger = logging.getLogger(__name__)
+
+# Token bucket refilled continuously at limit/60 per second; one round trip, O(1) per request.
+# A request takes ARGV[3] tokens (one per check in a batch) or none if fewer are left.
+# The caller passes its clock in ARGV[2]: before Redis 5 a script that reads TIME can't
+# write, and the bundled Windows Redis is 3.0, hence HMSET too. API hosts need synced clocks.
+_TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = capacity / 60
+local now = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HMSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], 61)
+return {allowed, tostring(tokens)}
+"""
+
+@dataclass
+class RateLimitResult:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset: int  # Seconds until the bucket is full again
+
+    def headers(self) -> Dict[str, str]:
+        return {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(self.reset)
+        }
+
+class RedisRateLimiter:
+    """Distributed per-minute limiter shared by all API processes.
+    
+    Falls back to the in-process RateLimiter while Redis is unreachable.
+    """
+    def __init__(self, fallback: RateLimiter, retry_interval: float = 5.0):
+        self.fallback = fallback
+        self.retry_interval = retry_interval
+        self._script = None
+        self._redis_down_until = 0.0
+    
+    async def hit(self, key: str, limit_per_minute: int, cost: int = 1) -> RateLimitResult:
+        if time.monotonic() >= self._redis_down_until:
+            try:
+                if self._script is None:
+                    self._script = get_async_redis().register_script(_TOKEN_BUCKET_SCRIPT)
+                allowed, tokens = await self._script(keys=[f"brymix:ratelimit:{key}"], args=[limit_per_minute, time.time(), cost])
+                tokens = float(tokens)
+                return RateLimitResult(
+                    allowed=bool(allowed),
+                    limit=limit_per_minute,
+                    remaining=int(tokens),
+                    reset=int((limit_per_minute - tokens) * 60 / limit_per_minute + 0.999)
+                )
+            except Exception as e:
+                # Don't pay a Redis timeout on every request while it is down
+                logger.warning(f"Redis rate limiter unavailable, using in-process limits: {e}")
+                self._redis_down_until = time.monotonic() + self.retry_interval
+        
+        allowed, remaining = self.fallback.hit(key, limit_per_minute, cost=cost)
+        return RateLimitResult(allowed=allowed, limit=limit_per_minute, remaining=remaining, reset=60)
+
+redis_rate_limiter = RedisRateLimiter(rate_limiter)
+
+def resolve_rate_limit(path: str, default_limit: int, endpoint_limits: Dict[str, int],
+                       overrides: Optional[Dict[str, int]] = None) -> Tuple[str, int]:
+    """Pick the limit for a path: the longest configured endpoint prefix, else "default".
+    
+    `overrides` (per API key owner) replaces any of the configured values.
+    Returns (scope, limit_per_minute).
+    """
+    limits = dict(endpoint_limits)
+    limits["default"] = default_limit
+    if overrides:
+        limits.update(overrides)
+    
+    scope = "default"
+    longest = 0
+    for prefix in limits:
+        if prefix == "default":
+            continue
+        matches = path == prefix or path.startswith(prefix.rstrip("/") + "/")
+        if matches and len(prefix) > longest:
+            scope, longest = prefix, len(prefix)
+    return scope, limits[scope]
+
 class SecurityManager:
     def __init__(self, encryption_key: str):
         # Ensure key is 32 bytes for Fernet
@@ -66,15 +168,6 @@ class SecurityManager:
     def decrypt(self, encrypted_data: str) -> str:
         return self.cipher.decrypt(encrypted_data.encode()).decode()
 
-def rate_limit_middleware(request: Request, limit_per_minute: int = 10):
-    """Rate limiting by API key"""
-    api_key = request.headers.get("X-API-Key")
-    if not api_key:
-        return
-    
-    if not rate_limiter.check_limit(api_key, limit_per_minute):
-        raise HTTPException(status_code=429, detail="Rate limit exceeded")
-
 def generate_secure_key() -> str:
     """Generate cryptographically secure API key"""
     return f"brymix_{secrets.token_urlsafe(32)}"
@@ -0,0 +1,24 @@
+"""Compact binary encoding for payloads kept in Redis"""
+import zlib
+import msgpack
+from typing import Any
+from config import settings
+
+# First byte tells how the rest is encoded
+_RAW = b"\x00"
+_ZLIB = b"\x01"
+
+def pack(obj: Any) -> bytes:
+    """Encode with msgpack, compressing payloads above the configured threshold"""
+    body = msgpack.packb(obj, use_bin_type=True)
+    threshold = settings.payload_compression_threshold
+    if threshold and len(body) > threshold:
+        return _ZLIB + zlib.compress(body, 6)
+    return _RAW + body
+
+def unpack(data: bytes) -> Any:
+    """Decode bytes produced by pack()"""
+    header, body = data[:1], data[1:]
+    if header == _ZLIB:
+        body = zlib.decompress(body)
+    return msgpack.unpackb(body, raw=False)
@@ -0,0 +1,109 @@
+"""Write-behind batching of intermediate job status transitions.
+
+Workers push transitions such as "processing" onto a Redis list instead of
+committing each one. A writer thread drains the list and applies everything
+it finds in a single transaction, so many workers share one commit. Final
+states (completed/failed with their result) are still committed directly by
+the worker before any webhook fires; the writer never overwrites them.
+"""
+import time
+import logging
+import threading
+from typing import List, Tuple
+from sqlalchemy import update, bindparam
+from app.database import SessionLocal, Job
+from app.redis_client import get_redis
+from app.serialization import pack, unpack
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY = "brymix:status_writes"
+FINAL_STATUSES = ("completed", "failed")
+
+class StatusWriter:
+    def __init__(self, interval_ms: int, batch_size: int):
+        self.interval = interval_ms / 1000
+        self.batch_size = batch_size
+        self._stop = threading.Event()
+        self._thread = None
+
+    def submit(self, job_id: str, status: str):
+        """Queue a non-final status change; falls back to a direct write if Redis is down"""
+        try:
+            get_redis().rpush(QUEUE_KEY, pack([job_id, status]))
+        except Exception as e:
+            logger.warning(f"Status queue unavailable ({e}), writing job {job_id} directly")
+            self.apply([(job_id, status)])
+
+    def apply(self, transitions: List[Tuple[str, str]]):
+        """Apply transitions in one transaction; rows already in a final state are left alone"""
+        # Only the newest transition per job matters
+        latest = {}
+        for job_id, status in transitions:
+            latest[job_id] = status
+
+        statement = (
+            update(Job)
+            .where(Job.id == bindparam("b_id"), *[Job.status != final for final in FINAL_STATUSES])
+            .values(status=bindparam("b_status"))
+        )
+        db = SessionLocal()
+        try:
+            db.execute(statement, [{"b_id": job_id, "b_status": status} for job_id, status in latest.items()])
+            db.commit()
+        finally:
+            db.close()
+
+    def drain_once(self, block_seconds: float = 1.0) -> int:
+        """Wait for the first queued transition, gather the rest of the batch and apply it"""
+        client = get_redis()
+        first = client.blpop(QUEUE_KEY, timeout=block_seconds)
+        if not first:
+            return 0
+
+        # Give other workers a moment to add to the same batch
+        time.sleep(self.interval)
+        pipe = client.pipeline()
+        pipe.lrange(QUEUE_KEY, 0, self.batch_size - 2)
+        pipe.ltrim(QUEUE_KEY, self.batch_size - 1, -1)
+        rest, _ = pipe.execute()
+
+        items = [first[1]] + rest
+        transitions = [tuple(unpack(item)) for item in items]
+        try:
+            self.apply(transitions)
+        except Exception:
+            # Put them back in order for the next pass
+            client.lpush(QUEUE_KEY, *reversed(items))
+            raise
+        return len(transitions)
+
+    def run(self):
+        logger.info("Status writer started")
+        while not self._stop.is_set():
+            try:
+                written = self.drain_once()
+                if written:
+                    logger.debug(f"Status writer applied {written} transition(s)")
+            except Exception as e:
+                logger.error(f"Status writer error: {e}")
+                self._stop.wait(1)
+
+    def start(self):
+        """Run the writer in a daemon thread of the current process"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, name="status-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+# Global writer instance
+status_writer = StatusWriter(settings.status_writer_interval_ms, settings.status_writer_batch_size)
+
+if __name__ == "__main__":
+    # Standalone writer for deployments that run workers without the API
+    logging.basicConfig(level=logging.INFO)
+    status_writer.run()
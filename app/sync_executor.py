@@ -0,0 +1,54 @@
+"""Bounded thread executor for blocking work called from async handlers"""
+import asyncio
+import math
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Any
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+class ExecutorSaturated(Exception):
+    """No slot became free in time; the caller should retry later"""
+    def __init__(self, retry_after: int):
+        super().__init__(f"Executor saturated, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+class BoundedExecutor:
+    """Runs blocking calls off the event loop with a concurrency cap and a bounded wait queue"""
+    def __init__(self, max_workers: int, max_queue: int, queue_timeout: float, name: str):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._semaphore = None  # Created on first use, inside the running loop
+        self._waiting = 0
+
+    async def run(self, fn: Callable, *args) -> Any:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+
+        retry_after = max(1, math.ceil(self.queue_timeout))
+        if self._semaphore.locked() and self._waiting >= self.max_queue:
+            raise ExecutorSaturated(retry_after)
+
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise ExecutorSaturated(retry_after)
+        finally:
+            self._waiting -= 1
+
+        future = asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        # Free the slot when the thread is really done, not when the client goes away
+        future.add_done_callback(lambda _: self._semaphore.release())
+        return await asyncio.shield(future)
+
+# MetaTrader5 keeps one terminal connection per process, so sync checks default to one at a time
+sync_check_executor = BoundedExecutor(
+    max_workers=settings.sync_check_concurrency,
+    max_queue=settings.sync_check_max_queue,
+    queue_timeout=settings.sync_check_queue_timeout,
+    name="sync-check"
+)
@@ -0,0 +1,143 @@
+"""Routing of dispatch tokens onto per-terminal Celery queues.
+
+Every configured terminal has its own queue (`terminal.<id>`) consumed by
+exactly one worker process pinned with MT5_TERMINAL_ID, so a terminal can
+never be used by two processes at once. Load and busy time per terminal are
+kept in Redis so routing and utilisation reporting see all processes.
+"""
+import time
+import logging
+from typing import Dict, Any, List
+from app.redis_client import get_redis
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "brymix:terminal"
+OWNER_TTL_SECONDS = 60
+
+# Drop the owner key only if this worker still holds it
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+def terminal_queue(terminal_id: int) -> str:
+    """Celery queue name for a terminal"""
+    return f"terminal.{terminal_id}"
+
+class TerminalRouter:
+    @staticmethod
+    def terminal_ids() -> List[int]:
+        return list(range(len(settings.mt5_terminal_paths())))
+
+    def route(self) -> str:
+        """Pick the least-loaded live terminal queue and count the token against it"""
+        redis_client = get_redis()
+        terminal_ids = self.terminal_ids()
+
+        pipe = redis_client.pipeline()
+        for terminal_id in terminal_ids:
+            pipe.get(f"{KEY_PREFIX}:{terminal_id}:queued")
+            pipe.get(f"{KEY_PREFIX}:{terminal_id}:busy")
+            pipe.exists(f"{KEY_PREFIX}:{terminal_id}:owner")
+        values = pipe.execute()
+
+        loads = {
+            terminal_id: int(values[3 * i] or 0) + int(values[3 * i + 1] or 0)
+            for i, terminal_id in enumerate(terminal_ids)
+        }
+        # A dead worker's counters stop growing; its queue would keep winning with nobody consuming it.
+        # Unpinned workers don't register, so with no owners at all every terminal is a candidate.
+        live = {terminal_id: load for i, (terminal_id, load) in enumerate(loads.items()) if values[3 * i + 2]}
+        loads = live or loads
+        chosen = min(loads, key=loads.get)
+        redis_client.incr(f"{KEY_PREFIX}:{chosen}:queued")
+        return terminal_queue(chosen)
+
+    def token_received(self, terminal_id: int):
+        """A worker took a token off its terminal queue"""
+        self._uncount(terminal_id)
+
+    def token_unsent(self, queue: str):
+        """A token route() counted never reached the broker"""
+        self._uncount(int(queue.rsplit(".", 1)[1]))
+
+    @staticmethod
+    def _uncount(terminal_id: int):
+        redis_client = get_redis()
+        if redis_client.decr(f"{KEY_PREFIX}:{terminal_id}:queued") < 0:
+            redis_client.set(f"{KEY_PREFIX}:{terminal_id}:queued", 0)
+
+    def live_tokens(self) -> int:
+        """Tokens waiting on the queues of terminals that have a worker"""
+        redis_client = get_redis()
+        terminal_ids = self.terminal_ids()
+        pipe = redis_client.pipeline()
+        for terminal_id in terminal_ids:
+            pipe.get(f"{KEY_PREFIX}:{terminal_id}:queued")
+            pipe.exists(f"{KEY_PREFIX}:{terminal_id}:owner")
+        values = pipe.execute()
+        return sum(int(values[2 * i] or 0) for i in range(len(terminal_ids)) if values[2 * i + 1])
+
+    def mark_busy(self, terminal_id: int):
+        redis_client = get_redis()
+        redis_client.set(f"{KEY_PREFIX}:{terminal_id}:busy", 1)
+        redis_client.hsetnx(f"{KEY_PREFIX}:{terminal_id}:stats", "since", time.time())
+
+    def mark_idle(self, terminal_id: int, busy_seconds: float):
+        pipe = get_redis().pipeline()
+        pipe.set(f"{KEY_PREFIX}:{terminal_id}:busy", 0)
+        pipe.hincrby(f"{KEY_PREFIX}:{terminal_id}:stats", "jobs", 1)
+        pipe.hincrbyfloat(f"{KEY_PREFIX}:{terminal_id}:stats", "busy_seconds", busy_seconds)
+        pipe.execute()
+
+    def claim(self, terminal_id: int, owner: str) -> bool:
+        """Register the single worker allowed to consume a terminal queue"""
+        redis_client = get_redis()
+        owner_key = f"{KEY_PREFIX}:{terminal_id}:owner"
+        if redis_client.set(owner_key, owner, nx=True, ex=OWNER_TTL_SECONDS):
+            return True
+        current = redis_client.get(owner_key)
+        return current is not None and current.decode() == owner
+
+    def heartbeat(self, terminal_id: int, owner: str):
+        get_redis().set(f"{KEY_PREFIX}:{terminal_id}:owner", owner, ex=OWNER_TTL_SECONDS)
+
+    def release(self, terminal_id: int, owner: str):
+        """Give up a terminal on shutdown so a restarted worker can claim it at once"""
+        get_redis().eval(_RELEASE_SCRIPT, 1, f"{KEY_PREFIX}:{terminal_id}:owner", owner)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Queue length, busy flag and utilisation per terminal"""
+        redis_client = get_redis()
+        now = time.time()
+        report = []
+
+        for terminal_id in self.terminal_ids():
+            pipe = redis_client.pipeline()
+            pipe.get(f"{KEY_PREFIX}:{terminal_id}:queued")
+            pipe.get(f"{KEY_PREFIX}:{terminal_id}:busy")
+            pipe.get(f"{KEY_PREFIX}:{terminal_id}:owner")
+            pipe.hgetall(f"{KEY_PREFIX}:{terminal_id}:stats")
+            queued, busy, owner, stats = pipe.execute()
+
+            busy_seconds = float(stats.get(b"busy_seconds", 0))
+            since = float(stats.get(b"since", now))
+            report.append({
+                "terminal_id": terminal_id,
+                "queue": terminal_queue(terminal_id),
+                "worker": owner.decode() if owner else None,
+                "queued": int(queued or 0),
+                "busy": bool(int(busy or 0)),
+                "jobs": int(stats.get(b"jobs", 0)),
+                "busy_seconds": round(busy_seconds, 3),
+                "utilisation": round(min(1.0, busy_seconds / (now - since)), 4) if now > since else 0.0
+            })
+
+        return report
+
+# Global router instance
+terminal_router = TerminalRouter()
@@ -1,8 +1,7 @@
 import httpx
 import hmac
 import hashlib
-import json
-from app.models import CheckResponse
+from typing import Union
 from config import settings
 import logging
 
@@ -10,24 +9,23 @@ logger = logging.getLogger(__name__)
 
 class WebhookClient:
     @staticmethod
-    def generate_signature(payload: str, webhook_secret: str) -> str:
+    def generate_signature(payload: Union[str, bytes], webhook_secret: str) -> str:
         """Generate HMAC-SHA256 signature for webhook"""
         logger.debug(f"Generating signature for payload length: {len(payload)} bytes")
+        if isinstance(payload, str):
+            payload = payload.encode()
         signature = hmac.new(
             webhook_secret.encode(),
-            payload.encode(),
+            payload,
             hashlib.sha256
         ).hexdigest()
         logger.debug(f"Signature generated successfully")
         return signature
     
     @staticmethod
-    async def send_result(callback_url: str, result_dict: dict, webhook_secret: str) -> bool:
-        """Send check result to callback URL"""
+    async def send_result(callback_url: str, payload: bytes, webhook_secret: str) -> bool:
+        """Send an already serialized check result to the callback URL; the exact bytes are signed"""
         try:
-            # Convert to JSON
-            payload = json.dumps(result_dict)
-            
             # Generate signature
             signature = WebhookClient.generate_signature(payload, webhook_secret)
             
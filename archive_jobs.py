@@ -0,0 +1,40 @@
+"""
+Move results of old completed jobs out of the database into compressed archive files
+
+Usage:
+  python archive_jobs.py [--older-than-days N] [--batch-size N] [--vacuum]
+"""
+
+import argparse
+from app.database import SessionLocal, engine
+from app.archive import job_archiver
+from config import settings
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive old job results")
+    parser.add_argument("--older-than-days", type=int, default=settings.archive_after_days)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--vacuum", action="store_true", help="SQLite only: give the freed space back to the OS")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        archived = job_archiver.archive(db, args.older_than_days, args.batch_size)
+        print(f"✅ Archived {archived} job results older than {args.older_than_days} days to {settings.archive_dir}")
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    if args.vacuum and engine.dialect.name == "sqlite":
+        with engine.connect() as connection:
+            connection.exec_driver_sql("VACUUM")
+        print("✅ Database vacuumed")
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("ARCHIVING OLD JOB RESULTS")
+    print("=" * 60)
+    main()
@@ -0,0 +1,69 @@
+"""
+Add jobs that finished before live analytics recording began to the Redis rollups
+
+Workers only count jobs as they finish, so rollups start empty. This counts
+every finished job from before the first live one, once: the end of the
+covered range is stored, so a second run only picks up what the first
+missed. Challenge outcome and violations come from the job_metrics tables,
+which the archiver fills in before it moves a result out (run
+backfill_job_metrics.py first for jobs that are not archived yet).
+
+Usage:
+  python backfill_analytics.py [--dry-run] [--workers N] [--batch-size N] [--restart]
+"""
+
+from datetime import datetime
+from app.analytics import job_analytics, LIVE_SINCE_KEY, BACKFILLED_KEY
+from app.backfill import ResultBackfill, run_cli
+from app.database import Job, JobMetrics, JobViolation
+from app.redis_client import get_redis
+
+class AnalyticsBackfill(ResultBackfill):
+    name = "analytics"
+    reads_result = False
+
+    def __init__(self):
+        redis_client = get_redis()
+        # No job recorded live yet: everything finished until now is history
+        redis_client.setnx(LIVE_SINCE_KEY, datetime.utcnow().isoformat())
+        self.before = datetime.fromisoformat(redis_client.get(LIVE_SINCE_KEY).decode())
+        done = redis_client.get(BACKFILLED_KEY)
+        self.after = datetime.fromisoformat(done.decode()) if done else None
+
+    def where(self):
+        criteria = [Job.status.in_(("completed", "failed")), Job.completed_at < self.before]
+        if self.after:
+            criteria.append(Job.completed_at >= self.after)
+        return criteria
+
+    def transform(self, row, result):
+        return {}
+
+    def write(self, db, changes):
+        # Only the Redis rollups change
+        job_ids = [row.id for row, _ in changes]
+        challenge = dict(db.query(JobMetrics.job_id, JobMetrics.challenge_status).filter(JobMetrics.job_id.in_(job_ids)))
+        violations = {}
+        for job_id, rule in db.query(JobViolation.job_id, JobViolation.rule).filter(JobViolation.job_id.in_(job_ids)):
+            violations.setdefault(job_id, []).append(rule)
+
+        job_analytics.record_jobs(
+            {
+                "tenant": row.api_key_owner,
+                "status": row.status,
+                "created_at": row.created_at,
+                "completed_at": row.completed_at,
+                "challenge_status": challenge.get(row.id),
+                "violation_types": violations.get(row.id, ())
+            }
+            for row, _ in changes
+        )
+
+    def finished(self):
+        get_redis().set(BACKFILLED_KEY, self.before.isoformat())
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("BACKFILLING ANALYTICS ROLLUPS")
+    print("=" * 60)
+    run_cli(AnalyticsBackfill())
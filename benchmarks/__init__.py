@@ -0,0 +1 @@
+# Offline benchmarks for the rule-checking pipeline (python -m benchmarks.run)
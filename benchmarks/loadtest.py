@@ -0,0 +1,376 @@
+"""
+End-to-end load test: API, fair-share queue, workers and webhooks
+
+Submits checks to POST /api/v1/check (or /api/v1/check/batch) at a Poisson
+arrival rate. Each check gets its own MT5 login, so nothing is coalesced.
+Webhooks arrive at a local sink server, and the tenant's /api/v1/events
+stream reports when each job started processing. After arrivals stop the
+run waits for outstanding jobs and reports:
+  - throughput (completed checks per minute)
+  - queue wait (submitted -> processing)
+  - end-to-end latency (submitted -> webhook received), with a histogram
+  - terminal utilisation over the run, from /api/v1/terminals
+
+With --start-stack the harness starts the API and one Celery worker per
+terminal itself, all on the fake MT5 backend with the given latency
+distribution and with the per-key rate limits lifted, and waits until every
+worker has claimed its terminal. Redis must already be running. Without it, point --api-url at
+a running stack whose workers have MT5_BACKEND=fake (or real terminals) and
+WEBHOOK_ALLOW_PRIVATE_URLS=true, so webhooks can reach the local sink.
+
+Usage:
+  python -m benchmarks.loadtest --start-stack --workers 3 --rate 1 --duration 120
+  python -m benchmarks.loadtest --api-url http://127.0.0.1:8000 --rate 5 --batch-size 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import Response
+from starlette.routing import Route
+
+HISTOGRAM_BOUNDS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000]
+
+class LoadTestState:
+    def __init__(self):
+        self.submitted_at: Dict[str, float] = {}
+        self.processing_at: Dict[str, float] = {}
+        self.webhook_at: Dict[str, float] = {}
+        self.failed: Dict[str, str] = {}
+        self.submit_latencies: List[float] = []
+        self.checks_sent = 0
+        self.requests_sent = 0
+        self.rejected: Dict[int, int] = {}  # HTTP status -> checks refused by admission control
+        self.rate_limited = 0  # Checks refused by the per-key rate limiter
+        self.errors: List[str] = []
+
+    def outstanding(self) -> int:
+        return sum(1 for job_id in self.submitted_at if job_id not in self.webhook_at and job_id not in self.failed)
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))]
+
+def summarize(values: List[float]) -> dict:
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None
+    }
+
+def histogram(values: List[float]) -> List[tuple]:
+    """(upper bound in seconds, count) per bucket; the last bucket's bound is None (unbounded)"""
+    counts = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+    for value in values:
+        index = next((i for i, bound in enumerate(HISTOGRAM_BOUNDS) if value <= bound), len(HISTOGRAM_BOUNDS))
+        counts[index] += 1
+    return list(zip(HISTOGRAM_BOUNDS + [None], counts))
+
+def sink_app(state: LoadTestState) -> Starlette:
+    """Webhook receiver that timestamps each job's delivery"""
+    async def receive(request):
+        received = time.time()
+        body = await request.body()
+        try:
+            state.webhook_at.setdefault(json.loads(body)["job_id"], received)
+        except (ValueError, KeyError):
+            state.errors.append("webhook without a job_id")
+        return Response(status_code=200)
+    return Starlette(routes=[Route("/webhook", receive, methods=["POST"])])
+
+def check_payload(index: int, callback_url: str) -> dict:
+    return {
+        "user_id": f"loadtest-{index}",
+        "challenge_id": f"loadtest-{index}",
+        "mt5_login": str(10_000_000 + index),
+        "mt5_password": "loadtest",
+        "mt5_server": "Synthetic-Demo",
+        "initial_balance": 100000.0,
+        "rules": {"max_drawdown_percent": 10.0, "profit_target_percent": 10.0},
+        "callback_url": callback_url
+    }
+
+async def submit(client: httpx.AsyncClient, state: LoadTestState, checks: List[dict], batch: bool):
+    """One /check or /check/batch request; records each accepted job's submit time"""
+    started = time.time()
+    state.requests_sent += 1
+    state.checks_sent += len(checks)
+    try:
+        if batch:
+            response = await client.post("/api/v1/check/batch", json={"checks": checks})
+        else:
+            response = await client.post("/api/v1/check", json=checks[0])
+    except httpx.HTTPError as e:
+        state.errors.append(f"submit failed: {e!r}")
+        return
+    state.submit_latencies.append(time.time() - started)
+
+    if response.status_code == 429 and response.json().get("detail") == "Rate limit exceeded":
+        state.rate_limited += len(checks)
+        return
+    if response.status_code in (429, 503):
+        state.rejected[response.status_code] = state.rejected.get(response.status_code, 0) + len(checks)
+        return
+    if response.status_code != 200:
+        state.errors.append(f"submit returned {response.status_code}: {response.text[:200]}")
+        return
+
+    body = response.json()
+    for job in body["jobs"] if batch else [body]:
+        state.submitted_at[job["job_id"]] = started
+    for rejection in body.get("rejected", []):
+        state.rejected[rejection["status_code"]] = state.rejected.get(rejection["status_code"], 0) + 1
+
+async def follow_events(client: httpx.AsyncClient, state: LoadTestState):
+    """Record when each job started processing, and which jobs failed, from the tenant event stream"""
+    while True:
+        try:
+            async with client.stream("GET", "/api/v1/events", timeout=None) as response:
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    event = json.loads(line[6:])
+                    if event["stage"] == "processing":
+                        state.processing_at.setdefault(event["job_id"], event["timestamp"])
+                    elif event["stage"] == "failed":
+                        state.failed[event["job_id"]] = event.get("error") or "failed"
+        except httpx.HTTPError as e:
+            state.errors.append(f"event stream dropped: {e!r}")
+            await asyncio.sleep(1)
+
+async def terminal_stats(client: httpx.AsyncClient) -> List[dict]:
+    response = await client.get("/api/v1/terminals")
+    response.raise_for_status()
+    return response.json()["terminals"]
+
+async def register_api_key(api_url: str) -> str:
+    async with httpx.AsyncClient(base_url=api_url) as client:
+        response = await client.post("/api/v1/register", json={
+            "name": "Load Test",
+            "email": f"loadtest-{int(time.time())}@example.com",
+            "company": "Load Test"
+        })
+        response.raise_for_status()
+        return response.json()["api_key"]
+
+def start_stack(args) -> List[subprocess.Popen]:
+    """API plus one solo Celery worker per fake terminal"""
+    env = dict(
+        os.environ,
+        MT5_BACKEND="fake",
+        MT5_FAKE_TERMINALS=str(args.workers),
+        MT5_FAKE_LATENCY_MS=str(args.mt5_latency_ms),
+        MT5_FAKE_LATENCY_SIGMA=str(args.mt5_latency_sigma),
+        MT5_FAKE_LOGIN_LATENCY_MS=str(args.mt5_login_latency_ms),
+        MT5_FAKE_POSITIONS=str(args.positions),
+        WEBHOOK_ALLOW_PRIVATE_URLS="true",
+        # Measure the pipeline, not the per-key limits (120/min on /api/v1/check by default)
+        RATE_LIMIT_PER_MINUTE="1000000",
+        RATE_LIMIT_ENDPOINTS="{}"
+    )
+    host, port = args.api_url.rsplit(":", 1)
+    processes = [subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", host.split("//")[-1], "--port", port,
+         "--log-level", "warning"],
+        env=env
+    )]
+    for terminal_id in range(args.workers):
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "celery", "-A", "app.celery_worker.celery_app", "worker",
+             "-Q", f"terminal.{terminal_id}", "-n", f"loadtest{terminal_id}@%h",
+             "--pool=solo", "--concurrency=1", "--loglevel=warning"],
+            env=dict(env, MT5_TERMINAL_ID=str(terminal_id))
+        ))
+    return processes
+
+async def wait_for_api(api_url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=api_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError(f"API at {api_url} did not come up within {timeout:.0f}s")
+
+async def wait_for_workers(client: httpx.AsyncClient, count: int, timeout: float = 60):
+    """Until `count` terminals have a worker; admission refuses every check while none has"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if sum(1 for terminal in await terminal_stats(client) if terminal["worker"]) >= count:
+            return
+        await asyncio.sleep(0.5)
+    raise RuntimeError(f"{count} worker(s) did not claim their terminals within {timeout:.0f}s")
+
+def report(state: LoadTestState, before: List[dict], after: List[dict], started: float, finished: float) -> dict:
+    queue_waits = [state.processing_at[j] - t for j, t in state.submitted_at.items() if j in state.processing_at]
+    end_to_end = [state.webhook_at[j] - t for j, t in state.submitted_at.items() if j in state.webhook_at]
+    completed = len(end_to_end)
+    window = max((max(state.webhook_at.values()) if state.webhook_at else finished) - started, 0.001)
+
+    terminals = []
+    for old, new in zip(before, after):
+        busy = new["busy_seconds"] - old["busy_seconds"]
+        terminals.append({
+            "terminal_id": new["terminal_id"],
+            "jobs": new["jobs"] - old["jobs"],
+            "busy_seconds": round(busy, 3),
+            "utilisation": round(min(1.0, busy / window), 4)
+        })
+
+    return {
+        "checks_sent": state.checks_sent,
+        "requests_sent": state.requests_sent,
+        "accepted": len(state.submitted_at),
+        "rejected": state.rejected,
+        "rate_limited": state.rate_limited,
+        "completed": completed,
+        "failed": len(state.failed),
+        "unfinished": state.outstanding(),
+        "errors": len(state.errors),
+        "window_seconds": round(window, 3),
+        "throughput_per_minute": round(completed / window * 60, 2),
+        "submit_seconds": summarize(state.submit_latencies),
+        "queue_wait_seconds": summarize(queue_waits),
+        "end_to_end_seconds": summarize(end_to_end),
+        "end_to_end_histogram": [[bound, count] for bound, count in histogram(end_to_end)],
+        "terminals": terminals,
+        "mean_utilisation": round(sum(t["utilisation"] for t in terminals) / len(terminals), 4) if terminals else None
+    }
+
+def print_report(result: dict):
+    def fmt(stats: dict) -> str:
+        if not stats["count"]:
+            return "no samples"
+        return " ".join(f"{key}={stats[key]:.3f}s" for key in ("p50", "p90", "p99", "max"))
+
+    print("\n" + "=" * 60)
+    print("LOAD TEST RESULTS")
+    print("=" * 60)
+    print(f"Checks sent:    {result['checks_sent']} in {result['requests_sent']} requests")
+    print(f"Accepted:       {result['accepted']}  rejected: {result['rejected'] or 0}  "
+          f"rate limited: {result['rate_limited']}  errors: {result['errors']}")
+    print(f"Completed:      {result['completed']}  failed: {result['failed']}  unfinished: {result['unfinished']}")
+    print(f"Throughput:     {result['throughput_per_minute']} checks/min over {result['window_seconds']:.1f}s")
+    print(f"Submit:         {fmt(result['submit_seconds'])}")
+    print(f"Queue wait:     {fmt(result['queue_wait_seconds'])}")
+    print(f"End to end:     {fmt(result['end_to_end_seconds'])}")
+    print("\nEnd-to-end latency histogram:")
+    peak = max((count for _, count in result["end_to_end_histogram"]), default=0) or 1
+    for bound, count in result["end_to_end_histogram"]:
+        label = f"<= {bound:g}s" if bound is not None else f"> {HISTOGRAM_BOUNDS[-1]:g}s"
+        print(f"  {label:>10} {count:6d} {'#' * round(count / peak * 40)}")
+    print("\nTerminal utilisation:")
+    for terminal in result["terminals"]:
+        print(f"  terminal {terminal['terminal_id']}: {terminal['utilisation']:.1%} ({terminal['jobs']} jobs, {terminal['busy_seconds']}s busy)")
+    if result["mean_utilisation"] is not None:
+        print(f"  mean: {result['mean_utilisation']:.1%}")
+
+async def run(args) -> dict:
+    state = LoadTestState()
+    sink = uvicorn.Server(uvicorn.Config(sink_app(state), host=args.sink_host, port=args.sink_port, log_level="warning"))
+    sink_task = asyncio.create_task(sink.serve())
+    callback_url = f"http://{args.sink_host}:{args.sink_port}/webhook"
+
+    await wait_for_api(args.api_url)
+    api_key = args.api_key or await register_api_key(args.api_url)
+    headers = {"X-API-Key": api_key}
+    limits = httpx.Limits(max_connections=args.max_connections)
+
+    async with httpx.AsyncClient(base_url=args.api_url, headers=headers, limits=limits, timeout=60) as client, \
+               httpx.AsyncClient(base_url=args.api_url, headers=headers) as events_client:
+        if args.start_stack:
+            await wait_for_workers(client, args.workers)
+        before = await terminal_stats(client)
+        events_task = asyncio.create_task(follow_events(events_client, state))
+        await asyncio.sleep(0.5)  # Let the event subscription settle before the first job can start
+
+        batch = args.batch_size > 0
+        per_request = args.batch_size if batch else 1
+        request_rate = args.rate / per_request
+        rng = random.Random(args.seed)
+        started = time.time()
+        submissions = []
+        index = 0
+        print(f"Submitting {args.rate}/s checks for {args.duration}s ({'batches of ' + str(per_request) if batch else 'one per request'})")
+        while time.time() - started < args.duration:
+            checks = [check_payload(index + i, callback_url) for i in range(per_request)]
+            index += per_request
+            submissions.append(asyncio.create_task(submit(client, state, checks, batch)))
+            await asyncio.sleep(rng.expovariate(request_rate))
+        await asyncio.gather(*submissions)
+
+        # Drain: wait for every accepted job to deliver its webhook or fail
+        deadline = time.monotonic() + args.drain
+        while state.outstanding() and time.monotonic() < deadline:
+            print(f"  waiting for {state.outstanding()} job(s)...")
+            await asyncio.sleep(min(5, max(0.1, deadline - time.monotonic())))
+        finished = time.time()
+
+        after = await terminal_stats(client)
+        events_task.cancel()
+
+    sink.should_exit = True
+    await sink_task
+    for error in state.errors[:10]:
+        print(f"❌ {error}")
+    return report(state, before, after, started, finished)
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load test of the check pipeline")
+    parser.add_argument("--api-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--api-key", help="Default: register a fresh tenant")
+    parser.add_argument("--rate", type=float, default=1.0, help="Checks per second (Poisson arrivals)")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds of arrivals")
+    parser.add_argument("--batch-size", type=int, default=0, help="Submit through /check/batch, N checks per request")
+    parser.add_argument("--drain", type=float, default=600, help="Seconds to wait for outstanding jobs afterwards")
+    parser.add_argument("--sink-host", default="127.0.0.1")
+    parser.add_argument("--sink-port", type=int, default=8099)
+    parser.add_argument("--max-connections", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    stack = parser.add_argument_group("--start-stack (fake MT5 backend)")
+    stack.add_argument("--start-stack", action="store_true", help="Start the API and workers for the run")
+    stack.add_argument("--workers", type=int, default=3, help="Fake terminals, one worker each")
+    stack.add_argument("--mt5-latency-ms", type=float, default=20, help="Median latency of an MT5 call")
+    stack.add_argument("--mt5-latency-sigma", type=float, default=0.5, help="Lognormal spread of MT5 call latency")
+    stack.add_argument("--mt5-login-latency-ms", type=float, default=1500, help="Median latency of an MT5 login")
+    stack.add_argument("--positions", type=int, default=20, help="Trades per synthetic account")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("BRYMIX LOAD TEST")
+    print("=" * 60)
+
+    processes = start_stack(args) if args.start_stack else []
+    try:
+        result = asyncio.run(run(args))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=30)
+
+    print_report(result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\n✅ Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
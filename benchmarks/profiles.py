@@ -0,0 +1,32 @@
+"""Synthetic trading styles the benchmarks run against, at production scale (scale=1)."""
+from functools import partial
+from typing import Callable
+from app.mt5_backend import synthetic_account
+
+PROFILES = {
+    # Many short trades, one at a time
+    "scalper": {
+        "positions": 10000, "min_hold_seconds": 30, "max_hold_seconds": 300,
+        "max_open": 1, "tick_seconds": 5
+    },
+    # Few positions held for days with a tick every second: millions of ticks
+    "swing": {
+        "positions": 12, "min_hold_seconds": 2 * 86400, "max_hold_seconds": 5 * 86400,
+        "max_open": 1, "tick_seconds": 1
+    },
+    # Opposite positions on the same symbol, several open at once
+    "hedger": {
+        "positions": 2000, "min_hold_seconds": 600, "max_hold_seconds": 7200,
+        "max_open": 8, "tick_seconds": 5
+    },
+}
+
+def profile_generator(name: str, scale: float = 1.0) -> Callable[..., dict]:
+    """synthetic_account for a profile; scale shrinks trade count (scalper, hedger) or hold time (swing)"""
+    options = dict(PROFILES[name])
+    if name == "swing":
+        options["min_hold_seconds"] = max(60, int(options["min_hold_seconds"] * scale))
+        options["max_hold_seconds"] = max(120, int(options["max_hold_seconds"] * scale))
+    else:
+        options["positions"] = max(2, int(options["positions"] * scale))
+    return partial(synthetic_account, **options)
@@ -0,0 +1,206 @@
+"""
+Benchmark the rule-checking pipeline against synthetic accounts, offline
+
+Each case runs in its own process against the fake MT5 backend. A case is
+a profile (see benchmarks/profiles.py) plus one stage: duration, drawdown
+or the full check_challenge. For each case the run records:
+  wall_seconds   best of --repeat timed runs
+  peak_rss_mb    peak resident memory of the case's process, account data included
+  alloc_peak_mb  peak traced Python allocations during one extra run
+Account generation and fetching deals are setup and are not timed.
+
+Usage:
+  python -m benchmarks.run [--scale 0.01] [--profile scalper] [--stage drawdown]
+                           [--save-baseline] [--baseline PATH] [--threshold 0.25]
+
+Without --save-baseline the results are compared with the baseline file, and
+the run exits 1 if any metric grew by more than --threshold (relative), or
+if a case fails now or failed (e.g. timed out) when the baseline was saved:
+such a case has nothing to compare against, so it can't pass silently.
+Baselines are only comparable at the same --scale on the same machine.
+"""
+
+import argparse
+import json
+import logging
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+PROFILES = ["scalper", "swing", "hedger"]
+STAGES = ["duration", "drawdown", "check_challenge"]
+METRICS = ["wall_seconds", "peak_rss_mb", "alloc_peak_mb"]
+DEFAULT_BASELINE = Path(__file__).parent / "baseline.json"
+MIN_SECONDS = 0.01  # Differences below this are timer noise, not regressions
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None  # Windows: no getrusage
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def run_case(profile: str, stage: str, scale: float, repeat: int) -> dict:
+    """Time one stage in this process and return its metrics"""
+    from app.mt5_backend import FakeBackend
+    from app.mt5_client import MT5Client
+    from app.duration_checker import DurationChecker
+    from app.drawdown_checker import DrawdownChecker
+    from app.rule_checker import RuleChecker
+    from app.models import CheckRequest, Rules
+    from benchmarks.profiles import profile_generator
+
+    request = CheckRequest(
+        user_id="bench",
+        challenge_id=f"{profile}-{stage}",
+        mt5_login="1001",
+        mt5_password="bench",
+        mt5_server="Synthetic-Demo",
+        initial_balance=100000.0,
+        rules=Rules(max_drawdown_percent=10, profit_target_percent=10),
+        callback_url="http://localhost/bench"
+    )
+    client = MT5Client("fake", backend=FakeBackend(generator=profile_generator(profile, scale)))
+    client.login(request.mt5_login, request.mt5_password, request.mt5_server)
+    deals = client.get_deals_history()
+    positions = client.get_positions_history()
+
+    if stage == "duration":
+        call = lambda: DurationChecker.check_positions(positions)
+    elif stage == "drawdown":
+        checker = DrawdownChecker(client)
+        call = lambda: checker.check_drawdown(request.initial_balance, request.rules.max_drawdown_percent, positions, deals)
+    else:
+        checker = RuleChecker(client)
+        call = lambda: checker.check_challenge(request, "bench")
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    call()
+    _, alloc_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "positions": len(positions),
+        "deals": len(deals),
+        "ticks": sum(len(series) for series in client.mt5._account["ticks"].values()),
+        "wall_seconds": round(min(timings), 4),
+        "peak_rss_mb": _peak_rss_mb(),
+        "alloc_peak_mb": round(alloc_peak / (1024 * 1024), 2)
+    }
+
+def _run_in_subprocess(profile: str, stage: str, scale: float, repeat: int, timeout: float) -> dict:
+    """Run a case in a fresh interpreter so its peak RSS is its own"""
+    command = [
+        sys.executable, "-m", "benchmarks.run",
+        "--child", f"{profile}:{stage}", "--scale", str(scale), "--repeat", str(repeat)
+    ]
+    try:
+        completed = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {"error": f"timed out after {timeout:.0f}s"}
+    if completed.returncode != 0:
+        return {"error": completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "failed"}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def compare(results: dict, baseline: dict, threshold: float) -> tuple:
+    """(regressions, warnings): metrics that grew past the threshold and failing cases;
+    cases the baseline can't judge"""
+    regressions = []
+    warnings = []
+    for case, metrics in results.items():
+        before = baseline["cases"].get(case)
+        if not before:
+            warnings.append(f"{case}: not in the baseline")
+            continue
+        if "error" in metrics:
+            regressions.append(f"{case}: {metrics['error']}")
+            continue
+        if "error" in before:
+            warnings.append(f"{case}: baseline failed ({before['error']}), now passes; save a new baseline")
+            continue
+        for metric in METRICS:
+            old, new = before.get(metric), metrics.get(metric)
+            if old is None or new is None:
+                continue
+            if metric == "wall_seconds" and new - old < MIN_SECONDS:
+                continue
+            if new > old * (1 + threshold):
+                regressions.append(f"{case}: {metric} {old} -> {new} (+{(new / old - 1) * 100:.0f}%)")
+    return regressions, warnings
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the rule-checking pipeline")
+    parser.add_argument("--profile", choices=PROFILES, action="append", help="Default: all profiles")
+    parser.add_argument("--stage", choices=STAGES, action="append", help="Default: all stages")
+    parser.add_argument("--scale", type=float, default=1.0, help="Shrink the profiles, e.g. 0.01 for a quick run")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=1800, help="Seconds allowed per case")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Relative growth that counts as a regression")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Per-trade log lines would dominate the timings
+    logging.basicConfig(level=logging.ERROR)
+
+    if args.child:
+        profile, stage = args.child.split(":")
+        print(json.dumps(run_case(profile, stage, args.scale, args.repeat)))
+        return
+
+    print("=" * 60)
+    print(f"RULE CHECKER BENCHMARKS (scale {args.scale})")
+    print("=" * 60)
+
+    results = {}
+    for profile in args.profile or PROFILES:
+        for stage in args.stage or STAGES:
+            case = f"{profile}/{stage}"
+            metrics = _run_in_subprocess(profile, stage, args.scale, args.repeat, args.timeout)
+            results[case] = metrics
+            if "error" in metrics:
+                print(f"❌ {case}: {metrics['error']}")
+            else:
+                print(
+                    f"✅ {case}: {metrics['wall_seconds']:.3f}s, RSS {metrics['peak_rss_mb']} MB, "
+                    f"allocated {metrics['alloc_peak_mb']} MB "
+                    f"({metrics['positions']} positions, {metrics['ticks']} ticks)"
+                )
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps({"scale": args.scale, "cases": results}, indent=2))
+        print(f"\n✅ Baseline saved to {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one")
+        return
+
+    baseline = json.loads(args.baseline.read_text())
+    if baseline["scale"] != args.scale:
+        print(f"\n❌ Baseline was recorded at scale {baseline['scale']}, not {args.scale}")
+        sys.exit(1)
+
+    regressions, warnings = compare(results, baseline, args.threshold)
+    for warning in warnings:
+        print(f"⚠️  {warning}")
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) over {args.threshold:.0%}:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        sys.exit(1)
+    print(f"\n✅ No regressions over {args.threshold:.0%} against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
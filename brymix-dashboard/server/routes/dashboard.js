@@ -35,30 +35,24 @@ router.get('/overview', auth, async (req, res) => {
       return res.status(404).json({ error: 'API key not found or inactive' });
     }
 
-    // Get jobs for selected API key(s)
-    let allJobs = [];
-    for (const apiKey of keysToQuery) {
-      try {
-        const response = await axios.get(`${FASTAPI_URL}/api/v1/jobs?limit=100`, {
-          headers: { 'X-API-Key': apiKey.keyId }
-        });
-        allJobs = [...allJobs, ...response.data.jobs];
-      } catch (error) {
-        console.error(`Error fetching jobs for key ${apiKey.name}:`, error.message);
-      }
-    }
-
-    // Sort by creation date (newest first)
-    allJobs.sort((a, b) => new Date(b.created_at) - new Date(a.created_at));
+    // Counts come from the owner's analytics rollups, so they cover the whole job history;
+    // every key of this user belongs to the same owner and returns the same figures
+    const headers = { 'X-API-Key': keysToQuery[0].keyId };
+    const [analyticsResponse, jobsResponse] = await Promise.all([
+      axios.get(`${FASTAPI_URL}/api/v1/analytics`, { headers, params: { period: '1d' } }),
+      axios.get(`${FASTAPI_URL}/api/v1/jobs`, { headers, params: { limit: 10 } })
+    ]);
+    const allTime = analyticsResponse.data.all_time;
+    const inFlight = analyticsResponse.data.in_flight;
 
     const stats = {
-      totalJobs: allJobs.length,
-      completedJobs: allJobs.filter(job => job.status === 'completed').length,
-      failedJobs: allJobs.filter(job => job.status === 'failed').length,
-      pendingJobs: allJobs.filter(job => job.status === 'pending').length,
-      processingJobs: allJobs.filter(job => job.status === 'processing').length,
+      totalJobs: allTime.jobs + (inFlight.pending || 0) + (inFlight.processing || 0),
+      completedJobs: allTime.status.completed || 0,
+      failedJobs: allTime.status.failed || 0,
+      pendingJobs: inFlight.pending || 0,
+      processingJobs: inFlight.processing || 0,
       totalApiKeys: activeApiKeys.length,
-      recentJobs: allJobs.slice(0, 10) // Last 10 jobs
+      recentJobs: jobsResponse.data.jobs // Last 10 jobs
     };
 
     res.json(stats);
@@ -125,11 +119,17 @@ router.get('/jobs', auth, async (req, res) => {
       return res.status(404).json({ error: 'API key not found or inactive' });
     }
 
-    // Get jobs for selected API key(s)
+    // Get jobs for selected API key(s), filtered by status on the API side
+    const params = { limit: 1000 };
+    if (status && status !== 'all') {
+      params.status = status;
+    }
+
     let allJobs = [];
     for (const apiKey of keysToQuery) {
       try {
-        const response = await axios.get(`${FASTAPI_URL}/api/v1/jobs?limit=1000`, {
+        const response = await axios.get(`${FASTAPI_URL}/api/v1/jobs`, {
+          params,
           headers: { 'X-API-Key': apiKey.keyId }
         });
         allJobs = [...allJobs, ...response.data.jobs];
@@ -138,11 +138,6 @@ router.get('/jobs', auth, async (req, res) => {
       }
     }
 
-    // Filter by status if provided
-    if (status && status !== 'all') {
-      allJobs = allJobs.filter(job => job.status === status);
-    }
-
     // Filter by search term if provided
     if (search) {
       const searchLower = search.toLowerCase();
@@ -201,68 +196,28 @@ router.get('/analytics', auth, async (req, res) => {
       return res.status(404).json({ error: 'API key not found or inactive' });
     }
 
-    // Get jobs for selected API key(s)
-    let allJobs = [];
-    for (const apiKey of keysToQuery) {
-      try {
-        const response = await axios.get(`${FASTAPI_URL}/api/v1/jobs?limit=1000`, {
-          headers: { 'X-API-Key': apiKey.keyId }
-        });
-        allJobs = [...allJobs, ...response.data.jobs];
-      } catch (error) {
-        console.error(`Error fetching jobs for key ${apiKey.name}:`, error.message);
-      }
-    }
-
-    // Filter by period
-    const now = new Date();
-    const periodMs = {
-      '1d': 24 * 60 * 60 * 1000,
-      '7d': 7 * 24 * 60 * 60 * 1000,
-      '30d': 30 * 24 * 60 * 60 * 1000,
-      '90d': 90 * 24 * 60 * 60 * 1000
-    };
-    
-    const cutoffDate = new Date(now.getTime() - (periodMs[period] || periodMs['7d']));
-    const filteredJobs = allJobs.filter(job => new Date(job.created_at) >= cutoffDate);
-
-    // Jobs over time (daily buckets)
-    const jobsOverTime = {};
-    filteredJobs.forEach(job => {
-      const date = new Date(job.created_at).toISOString().split('T')[0];
-      jobsOverTime[date] = (jobsOverTime[date] || 0) + 1;
-    });
-
-    // Status distribution
-    const statusDistribution = {};
-    filteredJobs.forEach(job => {
-      statusDistribution[job.status] = (statusDistribution[job.status] || 0) + 1;
+    // Rollups are kept per owner, so every key of this user returns the same figures
+    const response = await axios.get(`${FASTAPI_URL}/api/v1/analytics`, {
+      headers: { 'X-API-Key': keysToQuery[0].keyId },
+      params: { period: ['1d', '7d', '30d', '90d'].includes(period) ? period : '7d', granularity: 'day' }
     });
+    const analytics = response.data;
 
-    // Success rate
-    const completedJobs = filteredJobs.filter(job => job.status === 'completed').length;
-    const totalFinishedJobs = filteredJobs.filter(job => 
-      job.status === 'completed' || job.status === 'failed'
-    ).length;
+    const statusDistribution = { ...analytics.period.status, ...analytics.in_flight };
+    const completedJobs = analytics.period.status.completed || 0;
+    const totalFinishedJobs = analytics.period.jobs;
     const successRate = totalFinishedJobs > 0 ? (completedJobs / totalFinishedJobs) * 100 : 0;
 
-    // Average processing time
-    const jobsWithTimes = filteredJobs.filter(job => job.completed_at && job.created_at);
-    const averageProcessingTime = jobsWithTimes.length > 0 
-      ? jobsWithTimes.reduce((sum, job) => {
-          const processingTime = new Date(job.completed_at) - new Date(job.created_at);
-          return sum + processingTime;
-        }, 0) / jobsWithTimes.length / 1000 // Convert to seconds
-      : 0;
-
     res.json({
-      jobsOverTime: Object.entries(jobsOverTime).map(([date, count]) => ({
-        date,
-        count
-      })).sort((a, b) => a.date.localeCompare(b.date)),
+      jobsOverTime: analytics.buckets
+        .filter(bucket => bucket.jobs > 0)
+        .map(bucket => ({ date: bucket.start.split('T')[0], count: bucket.jobs })),
       statusDistribution,
       successRate: Math.round(successRate * 100) / 100,
-      averageProcessingTime: Math.round(averageProcessingTime * 100) / 100
+      averageProcessingTime: analytics.period.latency_seconds.avg || 0,
+      passRate: analytics.period.pass_rate,
+      violations: analytics.period.violations,
+      latencyPercentiles: analytics.period.latency_seconds
     });
   } catch (error) {
     console.error('Analytics error:', error);
@@ -1,6 +1,7 @@
 import sys
 import secrets
 from app.database import SessionLocal, ApiKey
+from app.api_key_cache import publish_invalidation
 
 def create_api_key(name: str):
     db = SessionLocal()
@@ -37,6 +38,7 @@ def deactivate_key(key: str):
         if api_key:
             api_key.active = False
             db.commit()
+            publish_invalidation(key)
             masked_key = f"{key[:12]}...{key[-4:]}"
             print(f"Deactivated key: {masked_key}")
         else:
@@ -0,0 +1,68 @@
+"""Initial schema: jobs and api_keys with tenant indexes
+
+Databases created by the old import-time create_all already have these
+tables, so each object is only created when missing.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def _existing_indexes(inspector, table):
+    return {index["name"] for index in inspector.get_indexes(table)}
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = inspector.get_table_names()
+    
+    if "jobs" not in tables:
+        op.create_table(
+            "jobs",
+            sa.Column("id", sa.String(), primary_key=True),
+            sa.Column("user_id", sa.String(), nullable=False),
+            sa.Column("challenge_id", sa.String(), nullable=False),
+            sa.Column("status", sa.String()),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("completed_at", sa.DateTime()),
+            sa.Column("result", sa.Text()),
+            sa.Column("error_message", sa.Text()),
+            sa.Column("api_key_owner", sa.String(), nullable=True)
+        )
+    
+    if "api_keys" not in tables:
+        op.create_table(
+            "api_keys",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("key", sa.String(), nullable=False, unique=True),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("active", sa.Boolean()),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("owner_email", sa.String(), nullable=True),
+            sa.Column("company", sa.String(), nullable=True),
+            sa.Column("webhook_secret", sa.String(), nullable=True)
+        )
+    
+    job_indexes = _existing_indexes(inspector, "jobs") if "jobs" in tables else set()
+    if "ix_jobs_owner_created" not in job_indexes:
+        op.create_index("ix_jobs_owner_created", "jobs", ["api_key_owner", "created_at"])
+    if "ix_jobs_owner_status" not in job_indexes:
+        op.create_index("ix_jobs_owner_status", "jobs", ["api_key_owner", "status"])
+    
+    key_indexes = _existing_indexes(inspector, "api_keys") if "api_keys" in tables else set()
+    if "ix_api_keys_owner_active" not in key_indexes:
+        # Webhook secret lookups and dashboard key listings filter on owner + active
+        op.create_index("ix_api_keys_owner_active", "api_keys", ["owner_email", "active"])
+
+def downgrade():
+    op.drop_index("ix_api_keys_owner_active", table_name="api_keys")
+    op.drop_index("ix_jobs_owner_status", table_name="jobs")
+    op.drop_index("ix_jobs_owner_created", table_name="jobs")
+    op.drop_table("api_keys")
+    op.drop_table("jobs")
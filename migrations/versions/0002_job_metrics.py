@@ -0,0 +1,46 @@
+"""Job metrics side tables
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    
+    if "job_metrics" not in tables:
+        op.create_table(
+            "job_metrics",
+            sa.Column("job_id", sa.String(), sa.ForeignKey("jobs.id"), primary_key=True),
+            sa.Column("api_key_owner", sa.String(), nullable=True),
+            sa.Column("completed_at", sa.DateTime()),
+            sa.Column("challenge_status", sa.String(), nullable=False),
+            sa.Column("max_drawdown_percent", sa.Float()),
+            sa.Column("profit_percent", sa.Float()),
+            sa.Column("total_trades", sa.Integer()),
+            sa.Column("currency", sa.String()),
+            sa.Column("violation_count", sa.Integer())
+        )
+        op.create_index("ix_job_metrics_owner_status", "job_metrics", ["api_key_owner", "challenge_status", "completed_at"])
+        op.create_index("ix_job_metrics_owner_drawdown", "job_metrics", ["api_key_owner", "max_drawdown_percent"])
+    
+    if "job_violations" not in tables:
+        op.create_table(
+            "job_violations",
+            sa.Column("job_id", sa.String(), sa.ForeignKey("job_metrics.job_id"), primary_key=True),
+            sa.Column("rule", sa.String(), primary_key=True),
+            sa.Column("api_key_owner", sa.String(), nullable=True),
+            sa.Column("count", sa.Integer())
+        )
+        op.create_index("ix_job_violations_owner_rule", "job_violations", ["api_key_owner", "rule"])
+
+def downgrade():
+    op.drop_table("job_violations")
+    op.drop_table("job_metrics")
@@ -0,0 +1,34 @@
+"""Job archive index, and an index for finding jobs to archive
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    
+    if "ix_jobs_status_completed" not in {index["name"] for index in inspector.get_indexes("jobs")}:
+        op.create_index("ix_jobs_status_completed", "jobs", ["status", "completed_at"])
+    
+    if "job_archive" not in inspector.get_table_names():
+        op.create_table(
+            "job_archive",
+            sa.Column("job_id", sa.String(), sa.ForeignKey("jobs.id"), primary_key=True),
+            sa.Column("path", sa.String(), nullable=False),
+            sa.Column("frame_offset", sa.Integer(), nullable=False),
+            sa.Column("frame_length", sa.Integer(), nullable=False),
+            sa.Column("line", sa.Integer(), nullable=False),
+            sa.Column("archived_at", sa.DateTime())
+        )
+
+def downgrade():
+    op.drop_table("job_archive")
+    op.drop_index("ix_jobs_status_completed", table_name="jobs")
@@ -0,0 +1,23 @@
+"""Result version on jobs, part of the job ETag so backfilled results reach pollers
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    
+    if "result_version" not in {column["name"] for column in inspector.get_columns("jobs")}:
+        op.add_column("jobs", sa.Column("result_version", sa.Integer(), nullable=False, server_default="0"))
+
+def downgrade():
+    with op.batch_alter_table("jobs") as batch_op:
+        batch_op.drop_column("result_version")
@@ -0,0 +1,56 @@
+"""
+Record a live MT5 account session as a fixture for the fake MT5 backend
+
+Runs a full challenge check against the terminal and saves everything the
+check read (account, deals, symbols, ticks, bars) to <MT5_FIXTURE_DIR>/<login>.json.
+Workers started with MT5_BACKEND=fake then replay that account offline.
+
+Usage:
+  python record_mt5_fixture.py --login 12345678 --password ... --server Broker-Server [--initial-balance 100000]
+"""
+
+import argparse
+import importlib
+from app.mt5_backend import RecordingBackend
+from app.mt5_client import MT5Client
+from app.rule_checker import RuleChecker
+from app.models import CheckRequest, Rules
+from config import settings
+
+def main():
+    parser = argparse.ArgumentParser(description="Record an MT5 account as a fixture")
+    parser.add_argument("--login", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--server", required=True)
+    parser.add_argument("--initial-balance", type=float, default=100000.0)
+    parser.add_argument("--fixture-dir", default=settings.mt5_fixture_dir)
+    args = parser.parse_args()
+
+    backend = RecordingBackend(importlib.import_module("MetaTrader5"), args.fixture_dir)
+    client = MT5Client(settings.mt5_path, settings.mt5_timeout, backend=backend)
+    request = CheckRequest(
+        user_id="fixture",
+        challenge_id="fixture",
+        mt5_login=args.login,
+        mt5_password=args.password,
+        mt5_server=args.server,
+        initial_balance=args.initial_balance,
+        rules=Rules(max_drawdown_percent=10, profit_target_percent=10),
+        callback_url="http://localhost/fixture"
+    )
+
+    try:
+        result = RuleChecker(client).check_challenge(request, "fixture")
+        path = backend.save()
+        print(f"✅ Recorded {result.metrics.total_trades} trades to {path}")
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        raise
+    finally:
+        client.shutdown()
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("RECORDING MT5 FIXTURE")
+    print("=" * 60)
+    main()
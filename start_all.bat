@@ -24,8 +24,22 @@ if %errorlevel% neq 0 (
 echo [OK] Redis running
 
 echo.
-echo Starting Celery Worker...
-start "Brymix Worker" cmd /k "cd /d %~dp0 && python -m celery -A app.celery_worker.celery_app worker --loglevel=info --pool=solo --concurrency=1"
+echo Applying database migrations...
+python -m alembic upgrade head
+if %errorlevel% neq 0 (
+    echo.
+    echo ERROR: Database migration failed!
+    pause
+    exit /b 1
+)
+
+echo.
+echo Starting Celery Workers (one pinned worker per MT5 terminal)...
+REM Terminal ids follow MT5_PATH, MT5_PATH_2, MT5_PATH_3 - list only the configured ones
+set TERMINALS=0 1 2
+for %%T in (%TERMINALS%) do (
+    start "Brymix Worker %%T" cmd /k "cd /d %~dp0 && set MT5_TERMINAL_ID=%%T&& python -m celery -A app.celery_worker.celery_app worker -Q terminal.%%T -n terminal%%T@%%COMPUTERNAME%% --loglevel=info --pool=solo --concurrency=1"
+)
 
 echo.
 echo Waiting for worker to initialize...
@@ -46,7 +60,7 @@ echo ============================================================
 echo.
 echo Services running:
 echo - Redis Server (background)
-echo - Celery Worker (new window)
+echo - Celery Workers, one per terminal (new windows)
 echo - API Server (new window)
 echo.
 echo Dashboard: http://localhost:8000 (Local)